@@ -1,39 +1,60 @@
-
 # Import required libraries
+import io
+
+import numpy as np
 import pandas as pd
 import streamlit as st
 
-# Define year-to-file mapping for Scope 2 data
-year_files = {
-    '2025': 'Raw_eGRID_EF_2025.xlsx',
-    '2024': 'Raw_eGRID_EF_2024.xlsx',
-    '2023': 'Raw_eGRID_EF_2023.xlsx',
-    '2022': 'Raw_eGRID_EF_2022.xlsx',
-    '2021': 'Raw_eGRID_EF_2021.xlsx',
-    '2020': 'Raw_eGRID_EF_2020.xlsx'
+from ef_tool.batch import (calculate_multi_gas, calculate_scope_1_stationary, calculate_scope_2_dual,
+                            batch_output_units, calculate_scope_2_location,
+                            multi_gas_activity_columns, read_activity, scope_1_activity_columns,
+                            scope_2_activity_columns, scope_2_dual_activity_columns, to_csv_bytes)
+from ef_tool.asof import year_match_rules
+from ef_tool.cache import cache_stats
+from ef_tool.calc import (convert_emission_rate, convert_scope_1_units, convert_to_mmbtu, convert_to_unit,
+                          get_emission_factors, get_gwp_values, get_market_ch4_n2o_factors, get_market_emission_rate,
+                          get_scope_1_emission_factors, scope_1_output_units, scope_2_output_units)
+from ef_tool.index import egrid_acronyms, heat_content, market_index, scope_1_index
+from ef_tool.materialize import lookup_materialized
+from ef_tool.matrix import scope_1_sensitivity, scope_2_sensitivity
+from ef_tool.store import year_files, load_factor_store
+from ef_tool.units import default_registry
+
+# Load the compiled factor store (built from the source workbooks on first use)
+store = load_factor_store()
+
+scope_1_fuels = scope_1_index(store).fuels
+unit_registry = default_registry()
+
+# How batch rows whose data year has no factors pick a factor year (the year used is in the results)
+year_match_labels = {
+    'exact': 'Exact data year only',
+    'latest': 'Latest year at or before the data year',
+    'nearest': 'Nearest year'
 }
 
-gwp_file_path = 'GWP.xlsx'
-scope_1_file_path = 'Scope_1_stationary_fuel.xlsx'
 
 
+@st.cache_data(max_entries=4, show_spinner="Calculating...")
+def run_batch(kind, file_bytes, file_name, gwp_column, output_unit, year_match, store_version):
+    """Read, calculate and CSV-encode an uploaded activity file once per file and settings.
 
-gwp_df = pd.read_excel(gwp_file_path)
-scope_1_df = pd.read_excel(scope_1_file_path)
+    Returns (rows, float column totals, float column NaN counts, first 1,000
+    rows, CSV bytes), so a rerun restores the summary and the encoded
+    download instead of recomputing them.
+    """
+    activity = read_activity(io.BytesIO(file_bytes), file_name)
+    options = {'year_match': year_match} if year_match is not None else {}
+    result = batch_calculators[kind](activity, store, gwp_column, output_unit, **options)
+    values = result.select_dtypes('float')
+    return len(result), values.sum(), values.isna().sum(), result.head(1000), to_csv_bytes(result)
 
-# Conversion factors
-conversion_factors_1 = {
-    "mtCO2e/kWh": 4.5359237e-7,
-    "mtCO2e/MWh": 4.5359237e-4,
-    "kgCO2e/kWh": 4.5359237e-4,
-    "kgCO2e/MWh": 0.45359237
-}
 
-conversion_factors_2 = {
-    "mtCO2e/therms": 1.0e-4,
-    "mtCO2e/mmBTU": 1.0e-3,
-    "kgCO2e/therms": 0.1,
-    "kgCO2e/mmBTU": 1
+batch_calculators = {
+    'scope_1_stationary': calculate_scope_1_stationary,
+    'multi_gas': calculate_multi_gas,
+    'scope_2_location': calculate_scope_2_location,
+    'scope_2_dual': calculate_scope_2_dual
 }
 
 # Streamlit app
@@ -53,57 +74,20 @@ gwp_column = st.selectbox("", ['AR6','AR5', 'AR4', 'SAR'])
 # Scope 1 Section - Stationary Combustion
 st.title("**Scope 1, Stationary Combustion**")
 
-# Function to get emission factors based on eGRID Acronym input and EF Category
-def get_emission_factors(acronym, category):
-    result = df[(df['eGRID Subregion Acronym'].str.upper() == acronym.upper()) & 
-                (df['EF Category'] == category)]
-    if not result.empty:
-        return result[['CO2 Factor (lb / MWh)', 'CH4 Factor (lb / MWh)', 'N2O Factor (lb / MWh)', 
-                       'EF Country', 'EF Authority', 'EF Data Year', 'EF Release Year']]
-    else:
-        return None
-
-# Function to extract relevant GWP values based on the selected column
-def get_gwp_values(column):
-    gwp_values = {
-        'CO2': gwp_df[gwp_df['Global Warming Potential'] == 'CO2'][column].values[0],
-        'CH4': gwp_df[gwp_df['Global Warming Potential'] == 'CH4'][column].values[0],
-        'N2O': gwp_df[gwp_df['Global Warming Potential'] == 'N2O'][column].values[0]
-    }
-    return gwp_values
-
 # User input: Select fuel type
-fuel_type = st.selectbox("Select Fuel Type", scope_1_df['Unnamed: 1'][2:].unique())
+fuel_type = st.selectbox("Select Fuel Type", scope_1_fuels)
 
 # User input: Select output units (kgCO2, mtCO2)
-scope_1_output_unit = st.selectbox("Select Output Unit for scope 1", ["mtCO2e/therms", "mtCO2e/mmBTU","kgCO2e/therms","kgCO2e/mmBTU"])
-
-# Function to get emission factors for selected fuel type
-def get_scope_1_emission_factors(fuel):
-    result = scope_1_df[scope_1_df['Unnamed: 1'] == fuel].iloc[0]
-    co2_factor = float(result['Unnamed: 2'])  # CO2 Factor (kg/mmBtu)
-    ch4_factor = float(result['Unnamed: 3'])  # CH4 Factor (g/mmBtu)
-    n2o_factor = float(result['Unnamed: 4'])  # N2O Factor (g/mmBtu)
-    ef_country = result['Unnamed: 5']  # EF Country
-    ef_authority = result['Unnamed: 6']  # EF Authority
-    ef_data_year = result['Unnamed: 7']  # EF Data Year
-    ef_release_year = result['Unnamed: 8']  # EF Release Year
-    ef_combustion_type = result['Unnamed: 9'] # EF Combustion type
-    return co2_factor, ch4_factor, n2o_factor, ef_country, ef_authority, ef_data_year, ef_release_year, ef_combustion_type
-
-# Function to convert raw factors to chosen unit
-def convert_scope_1_units(co2, ch4, n2o, gwp_values, unit):
-    conversion_factor = conversion_factors_2[unit]
-    co2_converted = co2 * conversion_factor * gwp_values['CO2']
-    ch4_converted = ch4 * conversion_factor * gwp_values['CH4']*0.001
-    n2o_converted = n2o * conversion_factor * gwp_values['N2O']*0.001
-    total_converted = co2_converted + ch4_converted + n2o_converted
-    return co2_converted, ch4_converted, n2o_converted, total_converted
+scope_1_output_unit = st.selectbox("Select Output Unit for scope 1", scope_1_output_units)
+
+# User input: optional activity quantity in energy or physical units (gallons, scf, ...) of the fuel
+scope_1_quantity = st.number_input("Activity quantity for scope 1 (optional)", min_value=0.0, value=0.0)
+scope_1_quantity_unit = st.selectbox("Activity quantity unit", heat_content(store).units(fuel_type))
 
 # When the user clicks the button, calculate Scope 1 emissions
 if st.button("Calculate Scope 1 Emission Factors"):
-    co2, ch4, n2o, ef_country, ef_authority, ef_data_year, ef_release_year, ef_combustion_type = get_scope_1_emission_factors(fuel_type)
-    gwp_values = get_gwp_values(gwp_column)
+    co2, ch4, n2o, ef_country, ef_authority, ef_data_year, ef_release_year, ef_combustion_type = get_scope_1_emission_factors(fuel_type, store)
+    gwp_values = get_gwp_values(gwp_column, store=store)
     co2_converted, ch4_converted, n2o_converted, total_converted = convert_scope_1_units(co2, ch4, n2o, gwp_values, scope_1_output_unit)
     
     # Display raw emission factors
@@ -138,6 +122,74 @@ if st.button("Calculate Scope 1 Emission Factors"):
     df_scope_1 = pd.DataFrame(scope_1_data)
     st.table(df_scope_1)
 
+    # Sensitivity: total CO2e under every GWP set and output unit, side by side
+    st.write("### Total CO2e for every GWP set and output unit")
+    co2e, reports, units = scope_1_sensitivity(co2, ch4, n2o, store)
+    st.table(pd.DataFrame(co2e[0], index=pd.Index(reports, name='GWP'), columns=units).map(lambda x: f"{x:.7f}"))
+
+    # Emissions of the entered activity, normalized to mmBtu with the fuel's heating value
+    if scope_1_quantity > 0:
+        mmbtu = convert_to_mmbtu(scope_1_quantity, fuel_type, scope_1_quantity_unit, store)
+        mass_unit = scope_1_output_unit.split('/')[0]
+        emissions = [value * mmbtu for value in convert_scope_1_units(co2, ch4, n2o, gwp_values, mass_unit + '/mmBtu')]
+        st.write("### Emissions for {:,} {} ({})".format(scope_1_quantity, scope_1_quantity_unit, mass_unit))
+        st.table(pd.DataFrame({
+            'Fuel Type': [fuel_type],
+            'Energy (mmBtu)': [f"{mmbtu:.4f}"],
+            'CO2 ({})'.format(mass_unit): [f"{emissions[0]:.7f}"],
+            'CH4 ({})'.format(mass_unit): [f"{emissions[1]:.7f}"],
+            'N2O ({})'.format(mass_unit): [f"{emissions[2]:.7f}"],
+            'Total CO2e ({})'.format(mass_unit): [f"{emissions[3]:.7f}"]
+        }))
+
+# Batch mode: Scope 1 stationary combustion for every row of an uploaded activity file
+with st.expander("Batch calculation from an activity file (Scope 1)"):
+    st.write("Upload a CSV or Parquet file with columns: {}. "
+             "quantity_unit is an energy unit ({}) or a volume or mass unit ({}) converted with the fuel's "
+             "heating value.".format(", ".join(scope_1_activity_columns), ", ".join(unit_registry.units('energy')),
+                                     ", ".join(unit_registry.units('volume') + unit_registry.units('mass'))))
+    scope_1_batch_output_unit = st.selectbox("Select Output Unit for Scope 1 batch", batch_output_units)
+    scope_1_activity_file = st.file_uploader("Activity file (Scope 1)", type=["csv", "parquet"])
+    if scope_1_activity_file is not None:
+        try:
+            rows, totals, missing, preview, csv_bytes = run_batch(
+                'scope_1_stationary', scope_1_activity_file.getvalue(), scope_1_activity_file.name, gwp_column,
+                scope_1_batch_output_unit, None, store.version)
+        except ValueError as e:
+            st.error(str(e))
+        else:
+            total_column = 'Total CO2e ({})'.format(scope_1_batch_output_unit)
+            unmatched = int(missing[total_column])
+            st.write("Rows: {:,}, total: {:,.4f} {}".format(rows, totals[total_column], scope_1_batch_output_unit))
+            if unmatched:
+                st.warning("{:,} rows have an unknown fuel type or quantity unit.".format(unmatched))
+            st.dataframe(preview)
+            st.download_button("Download results (CSV)", csv_bytes,
+                               file_name="scope_1_stationary_results.csv", mime="text/csv")
+
+# Batch mode: CO2e per site for direct emissions of any gas in GWP.xlsx (CO2, CH4, N2O, CFCs)
+with st.expander("Batch calculation for any GWP gas (CO2, CH4, N2O, CFCs)"):
+    st.write("Upload a CSV or Parquet file with columns: {}. gas is any gas listed in GWP.xlsx, "
+             "emissions_unit one of {}.".format(", ".join(multi_gas_activity_columns), ", ".join(unit_registry.units('mass'))))
+    multi_gas_output_unit = st.selectbox("Select Output Unit for gas batch", batch_output_units)
+    multi_gas_file = st.file_uploader("Activity file (any gas)", type=["csv", "parquet"])
+    if multi_gas_file is not None:
+        try:
+            sites, totals, missing, preview, csv_bytes = run_batch(
+                'multi_gas', multi_gas_file.getvalue(), multi_gas_file.name, gwp_column, multi_gas_output_unit, None,
+                store.version)
+        except ValueError as e:
+            st.error(str(e))
+        else:
+            total_column = 'Total CO2e ({})'.format(multi_gas_output_unit)
+            unmatched = int(missing[total_column])
+            st.write("Sites: {:,}, total: {:,.4f} {}".format(sites, totals[total_column], multi_gas_output_unit))
+            if unmatched:
+                st.warning("{:,} sites have a gas or unit that is unknown or has no {} GWP.".format(unmatched, gwp_column))
+            st.dataframe(preview)
+            st.download_button("Download results (CSV)", csv_bytes,
+                               file_name="multi_gas_results.csv", mime="text/csv")
+
 
 
 ##---------------------------------------------------------------------------------------------------------------------
@@ -147,16 +199,13 @@ st.title("**Scope 2, Location-based**")
 # User input: Select Data Year
 data_year_selected = st.selectbox("Select Data Year", list(year_files.keys()))
 
-# Load data based on year selection
-df = pd.read_excel(year_files[data_year_selected], engine='openpyxl')
-
 # User input: Select eGRID region
 st.markdown(
     'Select an eGRID Subregion Acronym '
     '<a href="https://www.epa.gov/egrid/power-profiler#/" target="_blank" title="Learn more about eGRID Subregions on EPA\'s Power Profiler website.">ℹ️</a>',
     unsafe_allow_html=True
 )
-acronym_input = st.selectbox("", df['eGRID Subregion Acronym'].unique())
+acronym_input = st.selectbox("", egrid_acronyms(store, data_year_selected))
 
 
 
@@ -165,40 +214,32 @@ acronym_input = st.selectbox("", df['eGRID Subregion Acronym'].unique())
 ef_category = st.selectbox("Select EF Category", ["Total Output Emission Factors", "Non-Baseload Emission Factors"])
 
 # User input: Select output units (mtCO2e/kWh, kgCO2e/kWh, kgCO2e/MWh)
-output_unit = st.selectbox("Select Output Unit for LB Scope 2", ["mtCO2e/kWh", "mtCO2e/MWh", "kgCO2e/kWh", "kgCO2e/MWh"])
+output_unit = st.selectbox("Select Output Unit for LB Scope 2", scope_2_output_units)
 
 
 
-# Function to convert raw factors to chosen unit
-def convert_to_unit(co2, ch4, n2o, gwp_values, unit):
-    conversion_factor = conversion_factors_1[unit]
-    co2_converted = co2 * conversion_factor * gwp_values['CO2']
-    ch4_converted = ch4 * conversion_factor * gwp_values['CH4']
-    n2o_converted = n2o * conversion_factor * gwp_values['N2O']
-    total_converted = co2_converted + ch4_converted + n2o_converted
-    return co2_converted, ch4_converted, n2o_converted, total_converted
-
 # Function to get emission factors, convert them, and display GWP values
 def get_emission_factors_and_convert(acronym, gwp_column, category, unit):
-    result = get_emission_factors(acronym, category)
+    result = get_emission_factors(acronym, category, data_year_selected, store)
     if result is not None:
-        co2 = result['CO2 Factor (lb / MWh)'].values[0]
-        ch4 = result['CH4 Factor (lb / MWh)'].values[0]
-        n2o = result['N2O Factor (lb / MWh)'].values[0]
-        
-        # Get GWP values for the selected column
-        gwp_values = get_gwp_values(gwp_column)
+        co2 = result['CO2 Factor (lb / MWh)']
+        ch4 = result['CH4 Factor (lb / MWh)']
+        n2o = result['N2O Factor (lb / MWh)']
         
-        # Convert the emission factors to the selected unit
-        co2_converted, ch4_converted, n2o_converted, total_converted = convert_to_unit(co2, ch4, n2o, gwp_values, unit)
+        # Converted factors for the selected GWP column and unit, read from the materialized table;
+        # it leaves out factors with a blank gas, which are converted here (to NaN) instead
+        converted = lookup_materialized(store, acronym, category, data_year_selected, gwp_column, unit)
+        if converted is None:
+            converted = convert_to_unit(co2, ch4, n2o, get_gwp_values(gwp_column, store=store), unit)
+        co2_converted, ch4_converted, n2o_converted, total_converted = converted
         
         return {
             'Raw CO2 (lb/MWh)': co2,
             'Raw CH4 (lb/MWh)': ch4,
             'Raw N2O (lb/MWh)': n2o,
-            'EF Country': result['EF Country'].values[0],
-            'EF Authority': result['EF Authority'].values[0],
-            'EF Data Year': result['EF Data Year'].values[0],
+            'EF Country': result['EF Country'],
+            'EF Authority': result['EF Authority'],
+            'EF Data Year': result['EF Data Year'],
             'EF Release Year': result['EF Release Year'],
             'CO2 ({})'.format(unit): co2_converted,
             'CH4 ({})'.format(unit): ch4_converted,
@@ -250,35 +291,49 @@ if st.button("Calculate Emission Factors"):
         
         # Display the converted factors table using st.table
         st.table(df_converted)
+
+        # Sensitivity: total CO2e under every GWP set and output unit, side by side
+        st.write("### Total CO2e for every GWP set and output unit")
+        co2e, reports, units = scope_2_sensitivity(factors_converted['Raw CO2 (lb/MWh)'], factors_converted['Raw CH4 (lb/MWh)'],
+                                                   factors_converted['Raw N2O (lb/MWh)'], store)
+        st.table(pd.DataFrame(co2e[0], index=pd.Index(reports, name='GWP'), columns=units).map(lambda x: f"{x:.9f}"))
         
     else:
         st.write(factors_converted)
 
+# Batch mode: location-based Scope 2 for every row of an uploaded activity file
+with st.expander("Batch calculation from an activity file (LB Scope 2)"):
+    st.write("Upload a CSV or Parquet file with columns: {}. "
+             "data_year is the eGRID data year, ef_category one of the EF categories above.".format(", ".join(scope_2_activity_columns)))
+    batch_output_unit = st.selectbox("Select Output Unit for LB Scope 2 batch", batch_output_units)
+    batch_year_match = st.selectbox("Factor year for data years without eGRID factors (LB Scope 2 batch)",
+                                    year_match_rules, format_func=year_match_labels.get)
+    activity_file = st.file_uploader("Activity file (LB Scope 2)", type=["csv", "parquet"])
+    if activity_file is not None:
+        try:
+            rows, totals, missing, preview, csv_bytes = run_batch(
+                'scope_2_location', activity_file.getvalue(), activity_file.name, gwp_column, batch_output_unit,
+                batch_year_match, store.version)
+        except ValueError as e:
+            st.error(str(e))
+        else:
+            total_column = 'Total CO2e ({})'.format(batch_output_unit)
+            unmatched = int(missing[total_column])
+            st.write("Rows: {:,}, total: {:,.4f} {}".format(rows, totals[total_column], batch_output_unit))
+            if unmatched:
+                st.warning("{:,} rows did not match an eGRID subregion, category and data year.".format(unmatched))
+            st.dataframe(preview)
+            st.download_button("Download results (CSV)", csv_bytes,
+                               file_name="scope_2_location_results.csv", mime="text/csv")
+
 #####-----------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------
 ### Scope-2 Market Based
 
-# File path
-market_file_path = 'EEI_clean.csv'
-
-# Load the data
-df_market = pd.read_csv(market_file_path)
-
-# Clean the column names to avoid issues
-df_market.columns = df_market.columns.str.strip().str.lower()
-
-# Rename columns to more usable names
-df_market.columns = [
-    'company_name', 'state', 'data_year', 'utility_specific_residual_mix_emission_rate',
-    'utility_avg_emission_rate', 'protocol', 'emissions_certified', 'emission_totals_intensity'
-]
-
-# Convert 'data_year' column to integer format (remove decimals)
-df_market['data_year'] = pd.to_numeric(df_market['data_year'], errors='coerce').fillna(0).astype(int)
+# State -> company -> year index of the cleaned EEI data
+market_records = market_index(store)
 
-# Convert 'state' column to string and sort alphabetically, removing "nan"
-df_market['state'] = df_market['state'].astype(str)
-sorted_states = sorted(df_market['state'].dropna().unique())
-sorted_states = [state for state in sorted_states if state.lower() != 'nan']
+# States sorted alphabetically, without "nan"
+sorted_states = market_records.states
 
 # Streamlit app title with smaller ℹ️ info icon
 
@@ -293,55 +348,41 @@ st.markdown("""
 # User input: Select State (sorted alphabetically)
 state_input = st.selectbox("Select a State", sorted_states)
 
-# Filter data based on State to show all utility providers in that state
-filtered_state_data = df_market[df_market['state'] == state_input]
-
-# User input: Select Company Name
-company_name_input = st.selectbox("Select a Company Name", filtered_state_data['company_name'].unique())
-
-# Filter data based on selected company
-filtered_company_data = filtered_state_data[filtered_state_data['company_name'] == company_name_input]
+# User input: Select Company Name among the utility providers in that state
+company_name_input = st.selectbox("Select a Company Name", market_records.companies(state_input))
 
 # User input: Select Data Year
-data_year_input = st.selectbox("Select a Data Year", filtered_company_data['data_year'].unique())
+data_year_input = st.selectbox("Select a Data Year", market_records.years(state_input, company_name_input))
 
-# Filter data based on selected Data Year
-final_filtered_data = filtered_company_data[filtered_company_data['data_year'] == data_year_input]
+# Record for the selected utility and Data Year
+market_record = market_records.record(state_input, company_name_input, data_year_input)
 
-# Extract Utility Average Emission Rate and other relevant information
-if not final_filtered_data.empty:
-    utility_avg_emission_rate = final_filtered_data['utility_avg_emission_rate'].values[0]
-    protocol = final_filtered_data['protocol'].values[0]
-    emissions_certified = final_filtered_data['emissions_certified'].values[0]
+# Extract the resolved emission rate (residual mix, else utility average, else eGRID) and other relevant information
+if market_record is not None:
+    emission_rate, rate_source = get_market_emission_rate(state_input, company_name_input, data_year_input, store)
+    protocol = market_record['protocol']
+    emissions_certified = market_record['emissions_certified']
 
-    # Handle null or blank values
-    if pd.isna(utility_avg_emission_rate) or utility_avg_emission_rate == "":
-        utility_avg_emission_rate = "no value"
+    # EEI rates are CO2 only: CH4 and N2O come from the utility's eGRID subregion
+    market_ch4_n2o = get_market_ch4_n2o_factors(state_input, company_name_input, data_year_input, store)
 else:
     st.error("No data available for the selected criteria.")
 
 # User input: Select output units (mtCO2e/kWh, kgCO2e/kWh, kgCO2e/MWh)
-output_unit = st.selectbox("Select Output Unit for MB Scope 2", ["mtCO2e/kWh", "mtCO2e/MWh", "kgCO2e/kWh", "kgCO2e/MWh"])
-
-# Conversion factors
-conversion_factors_1 = {
-    "mtCO2e/kWh": 4.53592e-7,
-    "mtCO2e/MWh": 4.53592e-4,
-    "kgCO2e/kWh": 4.53592e-4,
-    "kgCO2e/MWh": 0.453592
-}
-
-# Function to convert emission rate to chosen unit
-def convert_emission_rate(emission_rate, unit):
-    if emission_rate == "no value":
-        return "no value"
-    conversion_factor = conversion_factors_1[unit]
-    converted_emission_rate = float(emission_rate) * conversion_factor
-    return f"{converted_emission_rate:.10f}"
+output_unit = st.selectbox("Select Output Unit for MB Scope 2", scope_2_output_units)
 
 # When the user clicks the button, run the calculation and display results
 if st.button("Calculate Emission Factors Scope 2"):
-    converted_emission_rate = convert_emission_rate(utility_avg_emission_rate, output_unit)
+    converted_emission_rate = convert_emission_rate(emission_rate, output_unit)
+    if market_ch4_n2o is not None:
+        _, converted_ch4, converted_n2o, _ = convert_to_unit(0.0, market_ch4_n2o[2], market_ch4_n2o[3],
+                                                            get_gwp_values(gwp_column, store=store), output_unit)
+    else:
+        converted_ch4 = converted_n2o = np.nan
+    converted_total = converted_emission_rate + converted_ch4 + converted_n2o
+    converted_emission_rate, converted_ch4, converted_n2o, converted_total = (
+        "no value" if np.isnan(value) else f"{value:.10f}"
+        for value in (converted_emission_rate, converted_ch4, converted_n2o, converted_total))
     
     # Display input data with formatted Data Year
     st.write("### Input Data:")
@@ -349,9 +390,11 @@ if st.button("Calculate Emission Factors Scope 2"):
         'Company Name': [company_name_input],
         'State': [state_input],
         'Data Year': [str(data_year_input)],  # Convert year to string for proper formatting 
-        'Utility Average Emission Rate (lbs CO2/MWh)': [utility_avg_emission_rate],
+        'Emission Rate (lbs CO2/MWh)': ["no value" if np.isnan(emission_rate) else emission_rate],
+        'Rate Source': [rate_source],
         'Protocol': [protocol],
-        'Emissions Certified': [emissions_certified]
+        'Emissions Certified': [emissions_certified],
+        'CH4/N2O eGRID Subregion': [market_ch4_n2o[0] if market_ch4_n2o is not None else "no value"]
     }
     df_input = pd.DataFrame(input_data)
     st.table(df_input)
@@ -362,9 +405,42 @@ if st.button("Calculate Emission Factors Scope 2"):
         'Emission Source': ['Electricity'],
         'eGRID': [company_name_input],
         'CO2 ({})'.format(output_unit): [converted_emission_rate],
-        'CH4 ({})'.format(output_unit): ["0.0000000000"],  # Placeholder values as no CH4 data provided
-        'N2O ({})'.format(output_unit): ["0.0000000000"],  # Placeholder values as no N2O data provided
-        'Total CO2e ({})'.format(output_unit): [converted_emission_rate]
+        'CH4 ({})'.format(output_unit): [converted_ch4],
+        'N2O ({})'.format(output_unit): [converted_n2o],
+        'Total CO2e ({})'.format(output_unit): [converted_total]
     }
     df_converted = pd.DataFrame(converted_data)
-    st.table(df_converted)
\ No newline at end of file
+    st.table(df_converted)
+
+# Batch mode: location- and market-based Scope 2 side by side for every meter of an uploaded activity file
+with st.expander("Batch dual reporting from an activity file (LB and MB Scope 2)"):
+    st.write("Upload a CSV or Parquet file with columns: {}. "
+             "utility is the EEI company name for the meter's state.".format(", ".join(scope_2_dual_activity_columns)))
+    dual_output_unit = st.selectbox("Select Output Unit for dual reporting batch", batch_output_units)
+    dual_year_match = st.selectbox("Factor year for data years without factors (dual reporting batch)",
+                                   year_match_rules, format_func=year_match_labels.get)
+    dual_file = st.file_uploader("Activity file (LB and MB Scope 2)", type=["csv", "parquet"])
+    if dual_file is not None:
+        try:
+            rows, totals, missing, preview, csv_bytes = run_batch(
+                'scope_2_dual', dual_file.getvalue(), dual_file.name, gwp_column, dual_output_unit, dual_year_match,
+                store.version)
+        except ValueError as e:
+            st.error(str(e))
+        else:
+            lb_total, mb_total = ('{} Total CO2e ({})'.format(method, dual_output_unit) for method in ('LB', 'MB'))
+            mb_co2 = 'MB CO2 ({})'.format(dual_output_unit)
+            st.write("Rows: {:,}, LB total: {:,.4f} {}, MB total: {:,.4f} {}".format(
+                rows, totals[lb_total], dual_output_unit, totals[mb_total], dual_output_unit))
+            # MB CO2 is NaN only without an EEI match; MB CH4/N2O can also lack eGRID factors
+            for method, column in (('eGRID subregion, category and data year', lb_total), ('EEI utility and data year', mb_co2)):
+                unmatched = int(missing[column])
+                if unmatched:
+                    st.warning("{:,} rows did not match an {}.".format(unmatched, method))
+            st.dataframe(preview)
+            st.download_button("Download results (CSV)", csv_bytes,
+                               file_name="scope_2_dual_results.csv", mime="text/csv")
+
+# Shared dataset cache statistics (hits, misses, evictions and memory per dataset)
+with st.sidebar.expander("Data cache"):
+    st.dataframe(cache_stats())
@@ -0,0 +1,77 @@
+"""As-of year matching for millions of activity rows.
+
+Builds a synthetic factor table of 10,000 entities (subregions or
+utilities) that each report a random subset of 2000-2025, then matches
+activity rows with data years 1998-2030 under every rule and times it
+against a per-row Python loop over each entity's sorted years
+(extrapolated). A small hand-built table checks each rule's result,
+including the nearest-year tie, before timing. Run from the repository
+root::
+
+    python -m benchmarks.bench_asof [rows]
+"""
+import bisect
+import sys
+import time
+
+import numpy as np
+
+from ef_tool.asof import YearTable, year_match_rules
+
+
+def _loop_latest(years_by_entity, entities, years):
+    out = np.full(len(entities), -1, dtype=np.int64)
+    for i, (entity, year) in enumerate(zip(entities.tolist(), years.tolist())):
+        available = years_by_entity.get(entity, [])
+        pos = bisect.bisect_right(available, year) - 1
+        if pos >= 0:
+            out[i] = available[pos]
+    return out
+
+
+def check_rules():
+    """Assert the factor year each rule picks on a small table with known answers."""
+    # Entity 0 has 2010 and 2014, entity 1 has 2020; rows are record positions 10, 14, 20
+    table = YearTable([0, 0, 1], [2010, 2014, 2020], [10, 14, 20])
+    entities = np.array([0, 0, 0, 0, 0, 1, 2, 0])
+    years = np.array([2010, 2012, 2013, 2009, 2016, 2030, 2010, -1])
+    expected = {
+        'exact': [2010, -1, -1, -1, -1, -1, -1, -1],
+        'latest': [2010, 2010, 2010, -1, 2014, 2020, -1, -1],
+        # 2012 is two years from both 2010 and 2014: the earlier year wins
+        'nearest': [2010, 2010, 2014, 2010, 2014, 2020, -1, -1],
+    }
+    for rule, want in expected.items():
+        rows, matched = table.match(entities, years, rule)
+        assert matched.tolist() == want, (rule, matched.tolist())
+        assert rows.tolist() == [year - 2000 if year >= 0 else -1 for year in want], (rule, rows.tolist())
+
+
+def main(rows=5000000, n_entities=10000, loop_rows=200000):
+    check_rules()
+    rng = np.random.default_rng(0)
+    table_entities = np.repeat(np.arange(n_entities), 26)
+    table_years = np.tile(np.arange(2000, 2026), n_entities)
+    keep = rng.random(len(table_years)) < 0.4
+    table = YearTable(table_entities[keep], table_years[keep], np.flatnonzero(keep))
+    entities = rng.integers(0, n_entities, rows)
+    years = rng.integers(1998, 2031, rows)
+
+    print('{:,} activity rows, {:,} factor rows over {:,} entities'.format(rows, int(keep.sum()), n_entities))
+    for rule in year_match_rules:
+        start = time.perf_counter()
+        found, matched = table.match(entities, years, rule)
+        print('{:<8} {:.3f} s ({:.1%} matched)'.format(rule, time.perf_counter() - start, (found >= 0).mean()))
+
+    years_by_entity = {}
+    for entity, year in zip(table_entities[keep].tolist(), table_years[keep].tolist()):
+        years_by_entity.setdefault(entity, []).append(year)
+    start = time.perf_counter()
+    looped = _loop_latest(years_by_entity, entities[:loop_rows], years[:loop_rows])
+    loop_time = (time.perf_counter() - start) * rows / loop_rows
+    assert np.array_equal(looped, table.match(entities[:loop_rows], years[:loop_rows], 'latest')[1])
+    print('per-row loop (latest): {:.3f} s (extrapolated from {:,} rows)'.format(loop_time, loop_rows))
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:2]))
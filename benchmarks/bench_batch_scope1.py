@@ -0,0 +1,42 @@
+"""Throughput of the batch Scope 1 stationary combustion calculator.
+
+Run from the repository root::
+
+    python -m benchmarks.bench_batch_scope1 [rows]
+"""
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from ef_tool.batch import calculate_scope_1_stationary
+from ef_tool.index import scope_1_factors
+from ef_tool.store import load_factor_store
+
+
+def synthetic_activity(store, rows, seed=0):
+    fuels = np.array(scope_1_factors(store).fuels, dtype=object)
+    units = np.array(['mmBTU', 'therms'], dtype=object)
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'site': np.char.add('site-', rng.integers(0, 50000, rows).astype(str)),
+        'fuel_type': fuels[rng.integers(0, len(fuels), rows)],
+        'quantity': rng.uniform(1, 10000, rows),
+        'quantity_unit': units[rng.integers(0, len(units), rows)],
+    })
+
+
+def main(rows=1000000):
+    store = load_factor_store()
+    activity = synthetic_activity(store, rows)
+    calculate_scope_1_stationary(activity.head(1000), store, 'AR6')  # build indexes outside the timing
+    start = time.perf_counter()
+    result = calculate_scope_1_stationary(activity, store, 'AR6')
+    elapsed = time.perf_counter() - start
+    print('{:,} rows in {:.3f} s ({:,.0f} rows/s), {} unmatched'.format(
+        rows, elapsed, rows / elapsed, int(result['Total CO2e (mtCO2e)'].isna().sum())))
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1000000)
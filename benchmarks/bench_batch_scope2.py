@@ -0,0 +1,44 @@
+"""Throughput of the batch location-based Scope 2 calculator.
+
+Run from the repository root::
+
+    python -m benchmarks.bench_batch_scope2 [rows]
+"""
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from ef_tool.batch import calculate_scope_2_location
+from ef_tool.index import build_egrid_index
+from ef_tool.store import load_factor_store
+
+
+def synthetic_activity(store, rows, seed=0):
+    keys = list(build_egrid_index(store.egrid_all()))
+    rng = np.random.default_rng(seed)
+    picks = rng.integers(0, len(keys), rows)
+    acronyms, categories, years = (np.array([k[i] for k in keys], dtype=object)[picks] for i in range(3))
+    return pd.DataFrame({
+        'site': np.char.add('site-', (picks % 50000).astype(str)),
+        'egrid_subregion': acronyms,
+        'data_year': years.astype(int),
+        'ef_category': categories,
+        'kwh': rng.uniform(100, 100000, rows),
+    })
+
+
+def main(rows=1000000):
+    store = load_factor_store()
+    activity = synthetic_activity(store, rows)
+    calculate_scope_2_location(activity.head(1000), store, 'AR6')  # build indexes outside the timing
+    start = time.perf_counter()
+    result = calculate_scope_2_location(activity, store, 'AR6')
+    elapsed = time.perf_counter() - start
+    print('{:,} rows in {:.3f} s ({:,.0f} rows/s), {} unmatched'.format(
+        rows, elapsed, rows / elapsed, int(result['Total CO2e (mtCO2e)'].isna().sum())))
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1000000)
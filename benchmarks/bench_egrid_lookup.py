@@ -0,0 +1,47 @@
+"""Per-lookup cost of the eGRID index against the boolean-mask approach.
+
+Run from the repository root::
+
+    python -m benchmarks.bench_egrid_lookup
+"""
+import timeit
+
+from ef_tool.index import egrid_year_index, lookup_egrid
+from ef_tool.store import load_factor_store
+
+
+def mask_lookup(df, acronym, category):
+    result = df[(df['eGRID Subregion Acronym'].str.upper() == acronym.upper()) &
+                (df['EF Category'] == category)]
+    return result if not result.empty else None
+
+
+def main(number=2000):
+    store = load_factor_store()
+    year = store.years[0]
+    df = store.egrid(year)
+    index = egrid_year_index(store, year)
+    category = 'Total Output Emission Factors'
+    acronyms = list(df['eGRID Subregion Acronym'].unique())
+
+    def run_mask():
+        for acronym in acronyms:
+            mask_lookup(df, acronym, category)
+
+    def run_index():
+        for acronym in acronyms:
+            lookup_egrid(index, acronym, category, year)
+
+    lookups = number * len(acronyms)
+    mask_s = timeit.timeit(run_mask, number=max(1, number // 100))
+    index_s = timeit.timeit(run_index, number=number)
+    mask_us = mask_s / (max(1, number // 100) * len(acronyms)) * 1e6
+    index_us = index_s / lookups * 1e6
+    print('rows per year: {}, indexed keys: {}'.format(len(df), len(index.records)))
+    print('mask lookup : {:10.3f} us/lookup'.format(mask_us))
+    print('index lookup: {:10.3f} us/lookup'.format(index_us))
+    print('speedup     : {:10.0f}x'.format(mask_us / index_us))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,45 @@
+"""Incremental EEI ingest of the previous release.
+
+Diffs the previous cleaned release (EEI_clean_old.csv) against the current
+EEI_clean.parquet, applies the changes to the old release and checks that
+the result holds the same records as EEI_clean.parquet (inserts are
+appended, so rows are compared in key order), then times the diff and
+apply. Run from the repository root::
+
+    python -m benchmarks.bench_ingest_incremental [repeats]
+"""
+import os
+import sys
+import time
+
+import pandas as pd
+
+from ef_tool.ingest import apply_market_changes, clean_market_frame, diff_market, market_key_columns, read_eei_release
+from ef_tool.store import BASE_DIR, market_file_path
+
+
+def check_round_trip(old, current):
+    """Assert that applying diff_market(old, current) to ``old`` reproduces ``current``."""
+    changes = diff_market(old, current)
+    applied = apply_market_changes(old, changes)
+    pd.testing.assert_frame_equal(applied.sort_values(market_key_columns).reset_index(drop=True),
+                                  current.sort_values(market_key_columns).reset_index(drop=True))
+    return changes
+
+
+def main(repeats=20):
+    old = read_eei_release(os.path.join(BASE_DIR, 'EEI_clean_old.csv'))
+    current = clean_market_frame(pd.read_parquet(os.path.join(BASE_DIR, market_file_path)))
+    changes = check_round_trip(old, current)
+    print('{:,} inserted, {:,} updated, {:,} deleted, {:,} unchanged; applied release matches {}'.format(
+        len(changes['inserts']), len(changes['updates']), len(changes['deletes']), changes['unchanged'],
+        market_file_path))
+
+    start = time.perf_counter()
+    for _ in range(repeats):
+        apply_market_changes(old, diff_market(old, current))
+    print('diff + apply: {:.4f} s'.format((time.perf_counter() - start) / repeats))
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:2]))
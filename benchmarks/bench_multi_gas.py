@@ -0,0 +1,43 @@
+"""Sparse multi-gas CO2e on a thousand-gas axis.
+
+Builds a synthetic axis of 1,000 gases with random GWPs and a sparse
+rows x gases emissions matrix with a few gases per row, then times the
+CO2e product for one GWP column and for four at once. Run from the
+repository root::
+
+    python -m benchmarks.bench_multi_gas [rows] [gases per row]
+"""
+import sys
+import time
+
+import numpy as np
+
+from ef_tool.gases import SparseGasMatrix
+
+
+def main(rows=1000000, per_row=3, n_gases=1000):
+    rng = np.random.default_rng(0)
+    gases = ['gas-{}'.format(i) for i in range(n_gases)]
+    gwp = rng.uniform(1, 20000, (n_gases, 4))
+    nnz = rows * per_row
+    matrix = SparseGasMatrix(np.repeat(np.arange(rows), per_row), rng.integers(0, n_gases, nnz),
+                             rng.uniform(0, 10, nnz), rows, gases)
+
+    start = time.perf_counter()
+    co2e = matrix.dot(gwp[:, 0])
+    one_time = time.perf_counter() - start
+    start = time.perf_counter()
+    co2e_all = matrix.dot_all(gwp)
+    all_time = time.perf_counter() - start
+    assert np.allclose(co2e, co2e_all[:, 0])
+
+    dense_bytes = rows * n_gases * 8
+    sparse_bytes = matrix.rows.nbytes + matrix.gas_codes.nbytes + matrix.values.nbytes
+    print('{:,} rows x {:,} gases, {:,} non-zeros ({:,.0f} MB sparse vs {:,.0f} MB dense)'.format(
+        rows, n_gases, nnz, sparse_bytes / 1e6, dense_bytes / 1e6))
+    print('one GWP column:   {:.3f} s'.format(one_time))
+    print('four GWP columns: {:.3f} s'.format(all_time))
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:3]))
@@ -0,0 +1,47 @@
+"""Throughput of the parallel portfolio run by worker count.
+
+Builds synthetic Scope 1, Scope 2 location-based and Scope 2 market-based
+activity tables and times ``ef_tool.parallel.run_portfolio`` for 1, 2, 4,
+... workers up to the CPU count. Run from the repository root::
+
+    python -m benchmarks.bench_parallel_portfolio [rows per table]
+"""
+import sys
+
+import numpy as np
+import pandas as pd
+
+from benchmarks import bench_batch_scope1, bench_batch_scope2
+from ef_tool.index import market_index
+from ef_tool.parallel import run_portfolio, scaling_report
+from ef_tool.store import load_factor_store
+
+
+def synthetic_market_activity(store, rows, seed=0):
+    index = market_index(store)
+    keys = np.array([(state, company, year) for state in index.states for company in index.companies(state)
+                     for year in index.years(state, company)], dtype=object)
+    rng = np.random.default_rng(seed)
+    picks = keys[rng.integers(0, len(keys), rows)]
+    return pd.DataFrame({
+        'site': np.char.add('site-', rng.integers(0, 50000, rows).astype(str)),
+        'state': picks[:, 0],
+        'utility': picks[:, 1],
+        'data_year': picks[:, 2].astype(int),
+        'kwh': rng.uniform(100, 100000, rows),
+    })
+
+
+def main(rows=1000000):
+    store = load_factor_store()
+    activities = {
+        'scope_1_stationary': bench_batch_scope1.synthetic_activity(store, rows),
+        'scope_2_location': bench_batch_scope2.synthetic_activity(store, rows),
+        'scope_2_market': synthetic_market_activity(store, rows),
+    }
+    run_portfolio({kind: activity.head(1000) for kind, activity in activities.items()}, 'AR6', workers=1)
+    print(scaling_report(activities, 'AR6').to_string(index=False))
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1000000)
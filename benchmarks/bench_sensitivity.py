@@ -0,0 +1,59 @@
+"""All-GWP-set, all-unit CO2e: matrix engine against per-combination conversions.
+
+Converts N rows of eGRID factors into every GWP set x output unit three ways:
+one ``convert_to_unit`` call per row and combination (the app's scalar
+path), one array call per combination, and one ``ef_tool.matrix`` product.
+Run from the repository root::
+
+    python -m benchmarks.bench_sensitivity [rows]
+"""
+import sys
+import time
+
+import numpy as np
+
+from ef_tool.calc import convert_to_unit, get_gwp_values, scope_2_output_units
+from ef_tool.index import egrid_cube
+from ef_tool.matrix import scope_2_sensitivity
+from ef_tool.store import load_factor_store
+
+
+def main(rows=1000000):
+    store = load_factor_store()
+    factors = egrid_cube(store).factors.reshape(-1, 3)
+    factors = factors[~np.isnan(factors).any(axis=1)]
+    factors = factors[np.random.default_rng(0).integers(0, len(factors), rows)]
+    co2, ch4, n2o = factors.T
+    reports = ['SAR', 'AR4', 'AR5', 'AR6']
+    units = list(scope_2_output_units)
+    gwp = {report: get_gwp_values(report, store=store) for report in reports}
+
+    start = time.perf_counter()
+    co2e, _, _ = scope_2_sensitivity(co2, ch4, n2o, store, reports, units)
+    matrix_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    per_combination = np.stack([
+        np.stack([convert_to_unit(co2, ch4, n2o, gwp[report], unit)[3] for unit in units], axis=1)
+        for report in reports], axis=1)
+    array_time = time.perf_counter() - start
+
+    scalar_rows = min(rows, 2000)
+    start = time.perf_counter()
+    for i in range(scalar_rows):
+        for report in reports:
+            for unit in units:
+                convert_to_unit(co2[i], ch4[i], n2o[i], gwp[report], unit)
+    scalar_time = (time.perf_counter() - start) * rows / scalar_rows
+
+    combinations = len(reports) * len(units)
+    print('{:,} rows x {} GWP/unit combinations, max abs difference {:.2e}'.format(
+        rows, combinations, np.abs(co2e - per_combination).max()))
+    print('matrix engine:          {:8.3f} s'.format(matrix_time))
+    print('per-combination arrays: {:8.3f} s ({:.1f}x)'.format(array_time, array_time / matrix_time))
+    print('per-combination scalar: {:8.3f} s ({:.0f}x, extrapolated from {:,} rows)'.format(
+        scalar_time, scalar_time / matrix_time, scalar_rows))
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1000000)
@@ -0,0 +1,51 @@
+"""Peak memory of the streaming location-based Scope 2 run as the input grows.
+
+Writes synthetic activity CSVs of increasing size to a temporary directory
+and runs each through ``ef_tool.stream`` in its own process, reporting the
+peak resident set size. Run from the repository root::
+
+    python -m benchmarks.bench_stream_scope2 [max rows]
+"""
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.bench_batch_scope2 import synthetic_activity
+from ef_tool.store import load_factor_store
+
+
+def write_activity(store, path, rows, chunk_rows=500000):
+    for i, start in enumerate(range(0, rows, chunk_rows)):
+        chunk = synthetic_activity(store, min(chunk_rows, rows - start), seed=i)
+        chunk.to_csv(path, mode='w' if i == 0 else 'a', header=i == 0, index=False)
+
+
+child = """
+import resource, sys
+from ef_tool.store import load_factor_store
+from ef_tool.stream import stream_batch
+stream_batch('scope_2_location', sys.argv[1], load_factor_store(), 'AR6', output_path=sys.argv[2])
+print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+"""
+
+
+def main(max_rows=4000000):
+    store = load_factor_store()
+    with tempfile.TemporaryDirectory() as tmp:
+        rows = max_rows // 8
+        while rows <= max_rows:
+            source = os.path.join(tmp, 'activity.csv')
+            write_activity(store, source, rows)
+            start = time.perf_counter()
+            out = subprocess.run([sys.executable, '-c', child, source, os.path.join(tmp, 'results.parquet')],
+                                 check=True, capture_output=True, text=True).stdout
+            elapsed = time.perf_counter() - start
+            print('{:>10,} rows ({:,.0f} MB CSV): {:.2f} s, peak RSS {:,.0f} MB'.format(
+                rows, os.path.getsize(source) / 1e6, elapsed, int(out.split()[-1]) / 1024))
+            rows *= 2
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 4000000)
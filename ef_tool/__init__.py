@@ -0,0 +1,12 @@
+"""Shared data and calculation helpers for the Emission Factor Tool apps."""
+from ef_tool.calc import (conversion_factors_1, conversion_factors_2, convert_emission_rate, convert_scope_1_units,
+                          convert_to_mmbtu, convert_to_unit, get_emission_factors, get_gwp_values,
+                          get_market_ch4_n2o_factors, get_scope_1_emission_factors)
+from ef_tool.store import load_factor_store, year_files
+from ef_tool.units import conversion_factor, default_registry
+
+__all__ = [
+    'conversion_factor', 'conversion_factors_1', 'conversion_factors_2', 'convert_emission_rate',
+    'convert_scope_1_units', 'convert_to_mmbtu', 'convert_to_unit', 'default_registry', 'get_emission_factors',
+    'get_gwp_values', 'get_market_ch4_n2o_factors', 'get_scope_1_emission_factors', 'load_factor_store', 'year_files',
+]
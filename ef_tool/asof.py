@@ -0,0 +1,128 @@
+"""As-of join of activity years to the factor years a source actually has.
+
+eGRID publishes a subregion's factors for some data years only, and an EEI
+utility reports for the years it chose to. Activity for a year without
+factors (next year's meters, a year a utility skipped) is matched to a
+factor year by a deterministic rule:
+
+* ``exact``   -- the activity year itself, or no match
+* ``latest``  -- the latest factor year at or before the activity year
+* ``nearest`` -- the closest factor year, the earlier one on a tie
+
+A ``YearTable`` holds the sorted (entity, year) keys of one source, where
+an entity is a subregion/category or a state/utility code. Matching N
+activity rows factorizes them to distinct (entity, year) keys and runs one
+``np.searchsorted`` over the table for those, O(N + K log M), returning
+both the factor row and the year used.
+"""
+import numpy as np
+import pandas as pd
+
+year_match_rules = ['exact', 'latest', 'nearest']
+
+# Composite key entity * _year_stride + year; years must lie in [0, _year_stride)
+_year_stride = 1 << 16
+
+
+def year_values(years):
+    """Integer years for an array of year-like values; -1 where missing or not a year."""
+    codes, uniques = pd.factorize(pd.Series(years), use_na_sentinel=True)
+    values = pd.to_numeric(pd.Series(uniques, dtype=object), errors='coerce').to_numpy(dtype=float)
+    valid = ~np.isnan(values) & (values >= 0) & (values < _year_stride)
+    mapped = np.append(np.where(valid, np.floor(np.where(valid, values, 0)), -1), -1).astype(np.int64)
+    return mapped[codes]
+
+
+class YearTable:
+    """Sorted (entity, year) keys of the factor rows one source has.
+
+    ``rows`` is what a match returns for each key, e.g. a record position
+    or a position along the year axis of a factor cube. When a key occurs
+    more than once the first row wins.
+    """
+
+    def __init__(self, entities, years, rows):
+        entities = np.asarray(entities, dtype=np.int64)
+        years = np.asarray(years, dtype=np.int64)
+        keep = (entities >= 0) & (years >= 0) & (years < _year_stride)
+        keys = entities[keep] * _year_stride + years[keep]
+        order = np.argsort(keys, kind='stable')
+        keys = keys[order]
+        first = np.ones(len(keys), dtype=bool)
+        first[1:] = keys[1:] != keys[:-1]
+        self.keys = keys[first]
+        self.rows = np.asarray(rows, dtype=np.int64)[keep][order][first]
+
+    @property
+    def entities(self):
+        return self.keys // _year_stride
+
+    @property
+    def years(self):
+        return self.keys % _year_stride
+
+    def match(self, entities, years, rule='exact'):
+        """(rows, factor years) for activity entity codes and years under ``rule``.
+
+        Both are -1 where the entity is unknown (-1), the year is missing
+        (-1) or no factor year satisfies the rule. Rows are factorized to
+        distinct (entity, year) keys first, so the search runs once per key.
+        """
+        if rule not in year_match_rules:
+            raise ValueError('Unknown year match rule {!r}; use one of {}'.format(rule, ', '.join(year_match_rules)))
+        entities = np.asarray(entities, dtype=np.int64)
+        years = np.asarray(years, dtype=np.int64)
+        queries = np.where((entities >= 0) & (years >= 0), entities * _year_stride + years, -1)
+        codes, uniques = pd.factorize(queries)
+        rows, matched_years = self._match_keys(np.asarray(uniques, dtype=np.int64), rule)
+        return rows[codes], matched_years[codes]
+
+    def _match_keys(self, queries, rule):
+        valid = queries >= 0
+        entities, years = queries // _year_stride, queries % _year_stride
+        key_entities, key_years = self.entities, self.years
+
+        # Last key at or before each query, and the one after it
+        below = np.searchsorted(self.keys, queries, side='right') - 1
+        below_ok = valid & (below >= 0)
+        below_ok[below_ok] &= key_entities[below[below_ok]] == entities[below_ok]
+        if rule == 'exact':
+            below_ok[below_ok] &= key_years[below[below_ok]] == years[below_ok]
+        chosen = np.where(below_ok, below, -1)
+        if rule == 'nearest':
+            above = below + 1
+            above_ok = valid & (above < len(self.keys))
+            above_ok[above_ok] &= key_entities[above[above_ok]] == entities[above_ok]
+            below_gap = np.where(below_ok, years - key_years[np.maximum(below, 0)], np.iinfo(np.int64).max)
+            above_gap = np.where(above_ok, key_years[np.minimum(above, len(self.keys) - 1)] - years,
+                                 np.iinfo(np.int64).max)
+            chosen = np.where(above_ok & (above_gap < below_gap), above, chosen)
+
+        found = chosen >= 0
+        rows = np.full(len(chosen), -1, dtype=np.int64)
+        matched_years = np.full(len(chosen), -1, dtype=np.int64)
+        rows[found] = self.rows[chosen[found]]
+        matched_years[found] = key_years[chosen[found]]
+        return rows, matched_years
+
+
+def key_codes(columns, lookup):
+    """Entity code per row for parallel key ``columns``; -1 where ``lookup(*values)`` gives none.
+
+    Rows are factorized to distinct key combinations first, so ``lookup``
+    runs once per combination rather than once per row.
+    """
+    axes = [pd.factorize(pd.Series(values), use_na_sentinel=True) for values in columns]
+    combined = np.zeros(len(axes[0][0]), dtype=np.int64)
+    for codes, uniques in axes:
+        combined = combined * (len(uniques) + 1) + (codes + 1)
+    codes, uniques = pd.factorize(combined)
+    mapped = np.empty(len(uniques), dtype=np.int64)
+    for i, code in enumerate(uniques):
+        parts = []
+        for _, axis_uniques in reversed(axes):
+            code, part = divmod(int(code), len(axis_uniques) + 1)
+            parts.append(axis_uniques[part - 1] if part else None)
+        parts.reverse()
+        mapped[i] = -1 if any(part is None for part in parts) else lookup(*parts)
+    return mapped[codes]
@@ -0,0 +1,238 @@
+"""Vectorized batch calculators over uploaded activity tables.
+
+Each calculator takes a whole activity table, joins it to the factor store
+with array indexing and returns one result row per activity row.
+"""
+import io
+import os
+
+import numpy as np
+import pandas as pd
+
+from ef_tool.calc import scope_1_gas_mass_factors
+from ef_tool.gases import gas_matrix, gwp_weights
+from ef_tool.index import (default_ef_category, egrid_cube, eei_rates, gwp_matrix, heat_content, market_rate_sources,
+                           scope_1_factors)
+from ef_tool.units import conversion_factor, default_registry
+
+scope_2_activity_columns = ['site', 'egrid_subregion', 'data_year', 'ef_category', 'kwh']
+
+scope_2_market_activity_columns = ['site', 'state', 'utility', 'data_year', 'kwh']
+
+scope_2_dual_activity_columns = ['site', 'egrid_subregion', 'state', 'utility', 'data_year', 'ef_category', 'kwh']
+
+scope_1_activity_columns = ['site', 'fuel_type', 'quantity', 'quantity_unit']
+
+multi_gas_activity_columns = ['site', 'gas', 'emissions', 'emissions_unit']
+
+# Output masses offered by the batch calculators; any registry mass unit works
+batch_output_units = ["kgCO2e", "mtCO2e", "lbCO2e"]
+
+
+def read_activity(source, name=None):
+    """Read a CSV or Parquet activity table from a path or an uploaded file."""
+    name = name or getattr(source, 'name', None) or str(source)
+    if os.path.splitext(name)[1].lower() in ('.parquet', '.pq'):
+        return pd.read_parquet(source)
+    return pd.read_csv(source)
+
+
+def check_columns(activity, required):
+    missing = [c for c in required if c not in activity.columns]
+    if missing:
+        raise ValueError('Activity table is missing column(s): {}'.format(', '.join(missing)))
+
+
+def to_csv_bytes(result):
+    buffer = io.BytesIO()
+    result.to_csv(buffer, index=False)
+    return buffer.getvalue()
+
+
+def add_gas_columns(result, emissions, output_unit, prefix=''):
+    """Add per-gas and total columns for an (N, 3) CO2/CH4/N2O ``emissions`` array."""
+    for i, gas in enumerate(['CO2', 'CH4', 'N2O']):
+        result['{}{} ({})'.format(prefix, gas, output_unit)] = emissions[:, i]
+    result['{}Total CO2e ({})'.format(prefix, output_unit)] = emissions.sum(axis=1)
+    return result
+
+
+def _kwh(activity):
+    return pd.to_numeric(activity['kwh'], errors='coerce').to_numpy(dtype=float)
+
+
+def egrid_factors(activity, store, year_match='exact'):
+    """(N, 3) raw lb/MWh eGRID factors for each row's subregion, category and data year, and the eGRID years used.
+
+    ``year_match`` is the ``year_match_rules`` rule for data years the
+    subregion has no factors for; unmatched rows have year -1.
+    """
+    return egrid_cube(store).gather_years(activity['egrid_subregion'].to_numpy(),
+                                          activity['ef_category'].to_numpy(),
+                                          activity['data_year'].to_numpy(), year_match)
+
+
+def _scope_2_weights(store, gwp_column, output_unit):
+    return gwp_matrix(store).vector(gwp_column) * conversion_factor('lb/MWh', output_unit + '/kWh')
+
+
+def factor_years(years):
+    """Nullable integer column of the factor data years used; missing where nothing matched."""
+    return pd.arrays.IntegerArray(years, years < 0)
+
+
+def location_emissions(activity, store, gwp_column, output_unit, kwh, year_match='exact'):
+    """(N, 3) location-based emissions from each row's eGRID subregion factors, and the eGRID years used."""
+    raw, years = egrid_factors(activity, store, year_match)
+    return raw * _scope_2_weights(store, gwp_column, output_unit) * kwh[:, None], years
+
+
+def market_emissions(activity, store, gwp_column, output_unit, kwh, ch4_n2o_factors=None, year_match='exact'):
+    """(N, 3) market-based emissions, rate sources, eGRID subregions used for CH4/N2O and EEI years used.
+
+    CO2 comes from each row's resolved EEI record rate: residual mix, else
+    utility average, else the mapped eGRID subregion's CO2 factor; the
+    (N,) ``market_rate_sources`` names say which. EEI publishes CO2 only,
+    so CH4 and N2O use eGRID factors: ``ch4_n2o_factors`` when the caller
+    already has each row's (N, 3) eGRID factors, otherwise (and for rows
+    where those are NaN) the factors of the subregion the utility maps to.
+    The subregions used that way are returned, None where the caller's
+    factors were used. The EEI record's data year is matched under
+    ``year_match``. Rows matching no EEI record are NaN with source 'none'
+    and year -1.
+    """
+    rates = eei_rates(store)
+    pos, years = rates.match_positions(activity['state'].to_numpy(), activity['utility'].to_numpy(),
+                                       activity['data_year'].to_numpy(), year_match)
+    co2, codes = rates.gather_resolved(pos)
+    sources = np.array(market_rate_sources, dtype=object)[codes]
+    if ch4_n2o_factors is None:
+        mapped = np.ones(len(pos), dtype=bool)
+        ch4_n2o_factors = np.full((len(pos), 3), np.nan)
+    else:
+        mapped = np.isnan(ch4_n2o_factors[:, 1:]).any(axis=1)
+        ch4_n2o_factors = ch4_n2o_factors.copy()
+    subregions = np.where(mapped, rates.gather_subregions(pos), None)
+    if mapped.any():
+        categories = (activity['ef_category'].to_numpy() if 'ef_category' in activity.columns
+                      else np.full(len(pos), default_ef_category, dtype=object))
+        ch4_n2o_factors[mapped], _ = egrid_cube(store).gather_years(
+            subregions[mapped], categories[mapped], activity['data_year'].to_numpy()[mapped], year_match)
+    raw = np.column_stack([co2, ch4_n2o_factors[:, 1], ch4_n2o_factors[:, 2]])
+    raw[np.isnan(co2)] = np.nan
+    return raw * _scope_2_weights(store, gwp_column, output_unit) * kwh[:, None], sources, subregions, years
+
+
+def calculate_scope_2_location(activity, store, gwp_column, output_unit='mtCO2e', year_match='exact'):
+    """Location-based Scope 2 emissions for every row of ``activity``.
+
+    ``activity`` needs the ``scope_2_activity_columns``; ``ef_category`` is
+    one of the eGRID EF Category values. ``data_year`` is matched to the
+    subregion's eGRID years under the ``year_match`` rule (``exact``,
+    ``latest`` year at or before it, or ``nearest``), and the year used is
+    in ``factor_year``. Rows whose subregion/category/year matches nothing
+    get NaN emissions.
+    """
+    check_columns(activity, scope_2_activity_columns)
+    emissions, years = location_emissions(activity, store, gwp_column, output_unit, _kwh(activity), year_match)
+    result = activity[scope_2_activity_columns].copy()
+    result['factor_year'] = factor_years(years)
+    return add_gas_columns(result, emissions, output_unit)
+
+
+def calculate_scope_2_market(activity, store, gwp_column, output_unit='mtCO2e', year_match='exact'):
+    """Market-based Scope 2 emissions for every row of ``activity``.
+
+    ``activity`` needs the ``scope_2_market_activity_columns``; ``utility``
+    is the EEI company name. ``data_year`` is matched to the years the
+    utility reported under the ``year_match`` rule, with the EEI year used
+    in ``factor_year``. CO2 uses the record's resolved rate, named in
+    ``rate_source``; CH4 and N2O use the eGRID factors (``ef_category`` if
+    given, else total output) of the subregion in ``ch4_n2o_subregion``,
+    mapped from the utility or its state. Rows matching no EEI record get
+    NaN emissions.
+    """
+    check_columns(activity, scope_2_market_activity_columns)
+    emissions, sources, subregions, years = market_emissions(activity, store, gwp_column, output_unit,
+                                                             _kwh(activity), year_match=year_match)
+    result = activity[scope_2_market_activity_columns].copy()
+    result['factor_year'] = factor_years(years)
+    result['rate_source'] = sources
+    result['ch4_n2o_subregion'] = subregions
+    return add_gas_columns(result, emissions, output_unit)
+
+
+def calculate_scope_2_dual(activity, store, gwp_column, output_unit='mtCO2e', year_match='exact'):
+    """Location- and market-based Scope 2 emissions side by side, in one pass.
+
+    ``activity`` needs the ``scope_2_dual_activity_columns``: each meter row
+    names both its eGRID subregion and its utility. The activity is read
+    once and joined to the eGRID cube and the EEI rates together; the
+    meter's eGRID CH4/N2O factors serve both methods, and MB falls back to
+    the utility's mapped subregion where the meter's subregion is unknown. Each method's data
+    year is matched under ``year_match`` and recorded in ``LB factor_year``
+    and ``MB factor_year``. Results are the ``LB `` and ``MB `` prefixed gas
+    and total columns.
+    """
+    check_columns(activity, scope_2_dual_activity_columns)
+    kwh = _kwh(activity)
+    raw, lb_years = egrid_factors(activity, store, year_match)
+    result = activity[scope_2_dual_activity_columns].copy()
+    result['LB factor_year'] = factor_years(lb_years)
+    add_gas_columns(result, raw * _scope_2_weights(store, gwp_column, output_unit) * kwh[:, None], output_unit, 'LB ')
+    market, sources, _, mb_years = market_emissions(activity, store, gwp_column, output_unit, kwh, raw, year_match)
+    result['MB factor_year'] = factor_years(mb_years)
+    result['MB rate_source'] = sources
+    add_gas_columns(result, market, output_unit, 'MB ')
+    return result
+
+
+def calculate_scope_1_stationary(activity, store, gwp_column, output_unit='mtCO2e'):
+    """Scope 1 stationary combustion emissions for every row of ``activity``.
+
+    ``activity`` needs the ``scope_1_activity_columns``; ``quantity_unit`` is
+    any energy unit in the unit registry (mmBTU, therms, GJ, ...) or a
+    volume or mass unit (gallons, scf, litres, short tons, ...) converted
+    with the fuel's heating value. Rows are grouped by fuel code and unit
+    code and weighted with array math; unknown fuels or units give NaN
+    emissions.
+    """
+    check_columns(activity, scope_1_activity_columns)
+    factors = scope_1_factors(store)
+    fuel_pos = factors.positions(activity['fuel_type'].to_numpy())
+    raw = np.full((len(fuel_pos), 3), np.nan)
+    found = fuel_pos >= 0
+    raw[found] = factors.factors[fuel_pos[found]]
+
+    quantity = pd.to_numeric(activity['quantity'], errors='coerce').to_numpy(dtype=float)
+    mmbtu = quantity * heat_content(store).mmbtu_factors(activity['fuel_type'].to_numpy(),
+                                                         activity['quantity_unit'].to_numpy())
+    weights = gwp_matrix(store).vector(gwp_column) * scope_1_gas_mass_factors * conversion_factor('kg', output_unit)
+    emissions = raw * weights * mmbtu[:, None]
+
+    return add_gas_columns(activity[scope_1_activity_columns].copy(), emissions, output_unit)
+
+
+def calculate_multi_gas(activity, store, gwp_column, output_unit='mtCO2e'):
+    """CO2e per site of direct emissions of any gas listed in GWP.xlsx.
+
+    ``activity`` needs the ``multi_gas_activity_columns``, one row per
+    site and gas (e.g. CFC losses) with the mass in ``emissions_unit``
+    (any registry mass unit: kg, lb, g, mt, ...). The rows form a sparse
+    site x gas matrix and CO2e is its product with the GWP column. Sites with an
+    unknown gas or unit, or a gas without a GWP under ``gwp_column``, get
+    NaN CO2e.
+    """
+    check_columns(activity, multi_gas_activity_columns)
+    gases, weights = gwp_weights(store, gwp_column)
+    kg = (pd.to_numeric(activity['emissions'], errors='coerce').to_numpy(dtype=float) *
+          default_registry().factors_to(activity['emissions_unit'].to_numpy(), 'kg'))
+    matrix, sites = gas_matrix(activity['site'].to_numpy(), activity['gas'].to_numpy(), kg, gases)
+    # Distinct gases per site: one per unique (row, gas) pair
+    pairs = np.unique(matrix.rows * (len(gases) + 1) + (matrix.gas_codes + 1))
+    gas_count = np.bincount(pairs // (len(gases) + 1), minlength=matrix.n_rows)
+    return pd.DataFrame({
+        'site': sites,
+        'gases': gas_count,
+        'Total CO2e ({})'.format(output_unit): matrix.dot(weights) * conversion_factor('kg', output_unit),
+    })
@@ -0,0 +1,126 @@
+"""Memory-mapped binary factor bundle.
+
+The bundle holds the numeric factor tables as fixed-layout ``.npy`` arrays
+plus a small JSON manifest with the string keys for each axis:
+
+* ``egrid_factors.npy``  (subregion, category, year, gas) lb/MWh
+* ``scope_1_factors.npy`` (fuel, gas) CO2 kg/mmBtu, CH4/N2O g/mmBtu
+* ``gwp.npy``            (gas, assessment report)
+* ``eei_rates.npy``      (record, [residual mix, utility average]) lbs CO2/MWh;
+  each record's mapped eGRID subregion is in the manifest
+* ``eei_resolved.npy``   (record,) market-based CO2 rate after the fallback hierarchy
+* ``eei_rate_sources.npy`` (record,) int8 ``market_rate_sources`` code of that rate
+
+Arrays are opened with ``mmap_mode='r'``, so every worker process maps the
+same file and shares one physical copy through the page cache. Loading needs
+only NumPy and JSON; the workbooks and openpyxl are used only when building.
+
+Build it for the current store version with::
+
+    python -m ef_tool.bundle
+"""
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from ef_tool.index import (EEIRates, EGridCube, GWPMatrix, Scope1Factors, build_egrid_cube, build_egrid_index,
+                           build_eei_rates, build_gwp_matrix, build_scope_1_factors)
+
+bundle_dir_name = 'bundle'
+BUNDLE_FORMAT = 3
+
+
+def _json_safe(values):
+    return [None if pd.isna(v) else (int(v) if isinstance(v, (np.integer,)) else v) for v in values]
+
+
+def build_bundle(store):
+    """Write the bundle for ``store`` into its version directory; returns the path."""
+    path = os.path.join(store.path, bundle_dir_name)
+    cube = build_egrid_cube(build_egrid_index(store.egrid_all()))
+    scope_1 = build_scope_1_factors(store.scope_1)
+    gwp = build_gwp_matrix(store.gwp)
+    market = store.market
+    eei = build_eei_rates(market, store.subregion_map, cube)
+
+    manifest = {
+        'format': BUNDLE_FORMAT,
+        'version': store.version,
+        'egrid': {'acronyms': cube.acronyms, 'categories': cube.categories, 'years': cube.years},
+        'scope_1': {'fuels': scope_1.fuels},
+        'gwp': {'gases': gwp.gases, 'reports': gwp.reports},
+        'eei': {
+            'company_name': _json_safe(market['company_name']),
+            'state': _json_safe(market['state']),
+            'data_year': [int(y) for y in market['data_year']],
+            'subregions': list(eei.subregions),
+        },
+    }
+
+    tmp_dir = tempfile.mkdtemp(dir=store.path, prefix='.bundle-')
+    try:
+        np.save(os.path.join(tmp_dir, 'egrid_factors.npy'), np.ascontiguousarray(cube.factors))
+        np.save(os.path.join(tmp_dir, 'scope_1_factors.npy'), np.ascontiguousarray(scope_1.factors))
+        np.save(os.path.join(tmp_dir, 'gwp.npy'), np.ascontiguousarray(gwp.values))
+        np.save(os.path.join(tmp_dir, 'eei_rates.npy'), eei.rates)
+        np.save(os.path.join(tmp_dir, 'eei_resolved.npy'), eei.resolved)
+        np.save(os.path.join(tmp_dir, 'eei_rate_sources.npy'), eei.source_codes)
+        with open(os.path.join(tmp_dir, 'manifest.json'), 'w') as f:
+            json.dump(manifest, f)
+        try:
+            os.replace(tmp_dir, path)
+        except OSError:
+            # Another process finished the same bundle first
+            if not os.path.isdir(path):
+                raise
+            shutil.rmtree(tmp_dir)
+    except BaseException:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+    return path
+
+
+class FactorBundle:
+    """Memory-mapped factor arrays with the same lookup objects the index module builds."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, 'manifest.json')) as f:
+            self.manifest = json.load(f)
+        if self.manifest.get('format') != BUNDLE_FORMAT:
+            raise ValueError('Unsupported bundle format in {}'.format(path))
+        self.version = self.manifest['version']
+
+        def mapped(name):
+            return np.load(os.path.join(path, name + '.npy'), mmap_mode='r')
+
+        egrid = self.manifest['egrid']
+        self.egrid_cube = EGridCube(egrid['acronyms'], egrid['categories'], egrid['years'], mapped('egrid_factors'))
+        self.scope_1_factors = Scope1Factors(self.manifest['scope_1']['fuels'], mapped('scope_1_factors'))
+        gwp = self.manifest['gwp']
+        self.gwp_matrix = GWPMatrix(gwp['gases'], gwp['reports'], mapped('gwp'))
+        eei = self.manifest['eei']
+        self.eei_rates = EEIRates(eei['state'], eei['company_name'], eei['data_year'], mapped('eei_rates'),
+                                  eei['subregions'], mapped('eei_resolved'), mapped('eei_rate_sources'))
+
+
+def load_bundle(store):
+    """Memory-map the bundle for ``store``, building it first if it is missing or an older format."""
+    path = os.path.join(store.path, bundle_dir_name)
+    manifest_path = os.path.join(path, 'manifest.json')
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as f:
+            if json.load(f).get('format') != BUNDLE_FORMAT:
+                shutil.rmtree(path, ignore_errors=True)
+    if not os.path.exists(manifest_path):
+        build_bundle(store)
+    return FactorBundle(path)
+
+
+if __name__ == '__main__':
+    from ef_tool.store import load_factor_store
+    print('Built factor bundle in {}'.format(build_bundle(load_factor_store())))
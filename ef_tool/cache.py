@@ -0,0 +1,146 @@
+"""Process-wide dataset cache shared by every Streamlit session.
+
+Streamlit re-executes the app script on every interaction but imports
+``ef_tool`` once per server process, so a module-level cache here is shared
+by all sessions. Entries are keyed by the file they were loaded from and its
+(size, mtime) stamp, or by a content version when the caller has one: a
+changed dataset is reloaded on the next request and the old copy dropped.
+
+A cache can be given an entry and/or memory budget, in which case the least
+recently used datasets are evicted once the budget is exceeded. The
+location-based lookups keep their eGRID data in two such caches, one entry
+per data year: the year's record shard (``index.egrid_year_index``) and its
+materialized converted factors (``materialize.lookup_materialized``). So
+the heap they use depends on the budget, not on how many eGRID releases the
+store holds. The batch paths read the factor bundle's eGRID cube instead,
+which is memory-mapped, so only the pages read are resident.
+"""
+import os
+import sys
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+
+def resident_bytes(value):
+    """Approximate in-memory size of a cached value.
+
+    Dicts, lists and tuples are counted with their contents; other objects
+    can report their own size as ``nbytes``.
+    """
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(deep=True).sum())
+    if isinstance(value, pd.Series):
+        return int(value.memory_usage(deep=True))
+    if isinstance(value, np.ndarray):
+        return int(value.nbytes)
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(resident_bytes(k) + resident_bytes(v) for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(resident_bytes(v) for v in value)
+    nbytes = getattr(value, 'nbytes', None)
+    return int(nbytes) if nbytes is not None else sys.getsizeof(value)
+
+
+def file_stamp(path):
+    stat = os.stat(path)
+    return (stat.st_size, stat.st_mtime_ns)
+
+
+class DatasetCache:
+    """Named dataset cache with hit/miss counters and memory accounting.
+
+    ``max_entries`` and ``max_bytes`` bound the cache; ``None`` means
+    unbounded. The most recently loaded dataset is always kept, even if it
+    alone exceeds ``max_bytes``.
+    """
+
+    def __init__(self, max_entries=None, max_bytes=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._lock = threading.RLock()
+        self._entries = OrderedDict()
+        self._hits = {}
+        self._misses = {}
+        self._evictions = {}
+
+    def get(self, name, path, loader, version=None):
+        """Return dataset ``name`` loaded from ``path``, loading it on a miss.
+
+        With ``version`` the entry stays valid while the version is unchanged,
+        even if the same content is later read from a different path.
+        """
+        stamp = ('version', version) if version is not None else (path, file_stamp(path))
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is not None and entry[0] == stamp:
+                self._entries.move_to_end(name)
+                self._hits[name] = self._hits.get(name, 0) + 1
+                return entry[1]
+            value = loader(path)
+            self._entries[name] = (stamp, value, resident_bytes(value), path)
+            self._entries.move_to_end(name)
+            self._misses[name] = self._misses.get(name, 0) + 1
+            self._evict()
+            return value
+
+    def resident_bytes(self):
+        return sum(entry[2] for entry in self._entries.values())
+
+    def _evict(self):
+        while len(self._entries) > 1 and (
+                (self.max_entries is not None and len(self._entries) > self.max_entries) or
+                (self.max_bytes is not None and self.resident_bytes() > self.max_bytes)):
+            name, _ = self._entries.popitem(last=False)
+            self._evictions[name] = self._evictions.get(name, 0) + 1
+
+    def invalidate(self, name=None):
+        with self._lock:
+            if name is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(name, None)
+
+    def stats(self):
+        """One row per dataset: hits, misses, evictions, resident bytes and source file."""
+        columns = ['dataset', 'hits', 'misses', 'evictions', 'resident_bytes', 'path']
+        rows = []
+        with self._lock:
+            for name in sorted(set(self._hits) | set(self._misses)):
+                entry = self._entries.get(name)
+                rows.append({
+                    'dataset': name,
+                    'hits': self._hits.get(name, 0),
+                    'misses': self._misses.get(name, 0),
+                    'evictions': self._evictions.get(name, 0),
+                    'resident_bytes': entry[2] if entry else 0,
+                    'path': entry[3] if entry else None,
+                })
+        return pd.DataFrame(rows, columns=columns)
+
+
+def _env_number(name, default):
+    value = os.environ.get(name)
+    return default if value in (None, '') else float(value)
+
+
+def _year_cache():
+    # EF_TOOL_EGRID_CACHE_YEARS / EF_TOOL_EGRID_CACHE_MB override the defaults
+    max_mb = _env_number('EF_TOOL_EGRID_CACHE_MB', None)
+    return DatasetCache(max_entries=int(_env_number('EF_TOOL_EGRID_CACHE_YEARS', 3)),
+                        max_bytes=int(max_mb * 1024 * 1024) if max_mb is not None else None)
+
+
+dataset_cache = DatasetCache()
+
+# Per-year eGRID record shards and materialized factors: the most recently used years within budget
+egrid_year_cache = _year_cache()
+materialized_year_cache = _year_cache()
+
+
+def cache_stats():
+    """Statistics for every process-wide cache."""
+    return pd.concat([dataset_cache.stats(), egrid_year_cache.stats(), materialized_year_cache.stats()],
+                     ignore_index=True)
@@ -0,0 +1,157 @@
+"""Emission factor lookups and unit conversions, free of Streamlit.
+
+These are the calculation functions from app_15.py as plain functions over
+the shared factor store, so batch jobs and services can call them directly.
+Every function takes an optional ``store``; by default the compiled store
+is loaded once per process and rechecked for staleness (a manifest read and
+a stat of every source file) at most every ``default_store_ttl`` seconds.
+
+Factor arguments of the conversion functions may be scalars or NumPy arrays
+of any shape; GWP weighting is one broadcast multiply either way.
+"""
+import threading
+import time
+
+import numpy as np
+
+from ef_tool.index import (egrid_cube, egrid_year_index, eei_rates, gwp_matrix, heat_content, lookup_egrid,
+                           main_gases, market_rate_sources, market_subregions, scope_1_factor_columns, scope_1_index)
+from ef_tool.store import load_factor_store
+from ef_tool.units import conversion_factor
+
+# Output units offered for eGRID/EEI lb/MWh factors and Scope 1 per-mmBtu factors.
+# Factors come from the unit registry (unit_conversions.csv), so any unit it
+# knows can be passed to the conversion functions; these are the defaults.
+scope_2_output_units = ["mtCO2e/kWh", "mtCO2e/MWh", "kgCO2e/kWh", "kgCO2e/MWh", "lbCO2e/MWh", "kgCO2e/GJ"]
+scope_1_output_units = ["mtCO2e/therms", "mtCO2e/mmBTU", "kgCO2e/therms", "kgCO2e/mmBTU", "kgCO2e/GJ", "lbCO2e/mmBTU"]
+
+# Conversion factors: lb/MWh factors -> per kWh/MWh output units
+conversion_factors_1 = {unit: conversion_factor('lb/MWh', unit) for unit in scope_2_output_units}
+
+# Conversion factors: kg/mmBtu factors -> per therm/mmBTU output units
+conversion_factors_2 = {unit: conversion_factor('kg/mmBtu', unit) for unit in scope_1_output_units}
+
+# Scope 1 CO2 factors are in kg/mmBtu, CH4 and N2O in g/mmBtu
+scope_1_factor_units = ['kg/mmBtu', 'g/mmBtu', 'g/mmBtu']
+scope_1_gas_mass_factors = np.array([conversion_factor(unit, 'kg/mmBtu') for unit in scope_1_factor_units])
+
+
+# Seconds between staleness checks of the default store
+default_store_ttl = 5.0
+
+_default_store = {'store': None, 'checked': 0.0}
+_default_store_lock = threading.Lock()
+
+
+def _store(store):
+    if store is not None:
+        return store
+    now = time.monotonic()
+    with _default_store_lock:
+        if _default_store['store'] is None or now - _default_store['checked'] > default_store_ttl:
+            _default_store['store'] = load_factor_store()
+            _default_store['checked'] = now
+        return _default_store['store']
+
+
+def get_emission_factors(acronym, category, data_year, store=None):
+    """eGRID factors for a subregion, EF category and data year.
+
+    With scalar arguments returns the factor record (raw lb/MWh factors plus
+    provenance fields) or None. With array arguments returns an (N, 3)
+    CO2/CH4/N2O array with NaN rows where no factors exist.
+    """
+    store = _store(store)
+    if np.ndim(acronym) == 0:
+        return lookup_egrid(egrid_year_index(store, data_year), acronym, category, data_year)
+    n = len(acronym)
+    return egrid_cube(store).gather(np.asarray(acronym, dtype=object),
+                                    np.broadcast_to(np.asarray(category, dtype=object), n),
+                                    np.broadcast_to(np.asarray(data_year), n))
+
+
+def get_market_emission_rate(state, company, data_year, store=None):
+    """Resolved market-based CO2 rate (lbs CO2/MWh) for one EEI record and where it came from.
+
+    Returns (rate, source) with source one of ``market_rate_sources``:
+    residual mix, else utility average, else the mapped eGRID subregion's
+    CO2 factor. A record with none of these, or an unknown record, gives
+    (NaN, 'none').
+    """
+    rates = eei_rates(_store(store))
+    rate, codes = rates.gather_resolved(rates.positions([state], [company], [data_year]))
+    return rate[0], market_rate_sources[codes[0]]
+
+
+def get_market_ch4_n2o_factors(state, company, data_year, store=None, category='Total Output Emission Factors'):
+    """eGRID CH4 and N2O factors for an EEI utility, which publishes CO2 only.
+
+    Returns (subregion acronym, 'utility' or 'state' mapping level, CH4 lb/MWh,
+    N2O lb/MWh), or None when the utility maps to no subregion with factors
+    for ``data_year``.
+    """
+    store = _store(store)
+    acronym, source = market_subregions(store).subregion(state, company)
+    record = lookup_egrid(egrid_year_index(store, data_year), acronym, category, data_year) if acronym else None
+    if record is None:
+        return None
+    return acronym, source, record['CH4 Factor (lb / MWh)'], record['N2O Factor (lb / MWh)']
+
+
+def get_gwp_values(column, gases=main_gases, store=None):
+    """GWP vector for ``gases`` (CO2, CH4, N2O by default) under report ``column``."""
+    return gwp_matrix(_store(store)).vector(column, gases)
+
+
+def get_scope_1_emission_factors(fuel, store=None, combustion_type=None):
+    """Scope 1 factors and provenance for one fuel, as the app displays them.
+
+    Returns (co2 kg/mmBtu, ch4 g/mmBtu, n2o g/mmBtu, country, authority,
+    data year, release year, combustion type), or None for an unknown fuel.
+    """
+    result = scope_1_index(_store(store)).record(fuel, combustion_type)
+    if result is None:
+        return None
+    co2_factor, ch4_factor, n2o_factor = (result[col] for col in scope_1_factor_columns)
+    return (co2_factor, ch4_factor, n2o_factor, result['EF Country'], result['EF Authority'],
+            result['EF Data Year'], result['EF Release Year'], result['Combustion Type'])
+
+
+def convert_to_mmbtu(quantity, fuel, unit, store=None):
+    """Scope 1 activity ``quantity`` of ``fuel`` in ``unit`` (gallons, scf, short tons, litres, therms, ...) as mmBtu.
+
+    Physical quantities convert through the fuel's heating value in
+    Scope_1_heat_content.csv. Arguments may be scalars or arrays; unknown
+    units, or a fuel without a heating value for the unit's dimension, give
+    NaN.
+    """
+    fuels, units = np.broadcast_arrays(np.asarray(fuel, dtype=object), np.asarray(unit, dtype=object))
+    factors = heat_content(_store(store)).mmbtu_factors(fuels.ravel(), units.ravel()).reshape(fuels.shape)
+    return (np.asarray(quantity, dtype=float) * factors)[()]
+
+
+def stack_gases(co2, ch4, n2o):
+    """Stack per-gas factors (scalars or arrays) into a (..., 3) array."""
+    return np.stack(np.broadcast_arrays(co2, ch4, n2o), axis=-1).astype(float)
+
+
+def _weight(co2, ch4, n2o, weights):
+    converted = stack_gases(co2, ch4, n2o) * weights
+    co2_converted, ch4_converted, n2o_converted = np.moveaxis(converted, -1, 0)
+    return co2_converted, ch4_converted, n2o_converted, converted.sum(axis=-1)
+
+
+def convert_to_unit(co2, ch4, n2o, gwp_values, unit):
+    """Convert eGRID lb/MWh factors to ``unit`` (any registry per-energy unit); returns (co2, ch4, n2o, total)."""
+    return _weight(co2, ch4, n2o, np.asarray(gwp_values) * conversion_factor('lb/MWh', unit))
+
+
+def convert_scope_1_units(co2, ch4, n2o, gwp_values, unit):
+    """Convert Scope 1 per-mmBtu factors to ``unit`` (any registry per-energy unit); returns (co2, ch4, n2o, total)."""
+    return _weight(co2, ch4, n2o,
+                   np.asarray(gwp_values) * scope_1_gas_mass_factors * conversion_factor('kg/mmBtu', unit))
+
+
+def convert_emission_rate(emission_rate, unit):
+    """Convert EEI lbs CO2/MWh rates (scalar or array, NaN where missing) to ``unit``."""
+    return (np.asarray(emission_rate, dtype=float) * conversion_factor('lb/MWh', unit))[()]
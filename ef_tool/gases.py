@@ -0,0 +1,77 @@
+"""Emissions of any gas listed in GWP.xlsx, stored sparsely.
+
+A source emits a handful of gases out of the full GWP.xlsx list, so
+emissions are kept as (row, gas, value) triplets over the GWP.xlsx gas
+axis instead of a dense rows x gases table. CO2e is one sparse
+matrix-vector product with a GWP column, computed with ``np.bincount`` in
+O(non-zeros) time, so the cost does not depend on how many gases the GWP
+axis has.
+"""
+import numpy as np
+import pandas as pd
+
+from ef_tool.index import gwp_matrix
+
+
+def normalize_gas(gas):
+    return ''.join(str(gas).split()).casefold()
+
+
+def gas_positions(gases, names):
+    """Positions of ``names`` on the ``gases`` axis (any case or spacing); -1 where a gas is not listed."""
+    lookup = {}
+    for i, gas in enumerate(gases):
+        lookup.setdefault(normalize_gas(gas), i)
+    codes, uniques = pd.factorize(pd.Series(names), use_na_sentinel=True)
+    mapped = np.array([lookup.get(normalize_gas(u), -1) for u in uniques] + [-1], dtype=np.int64)
+    return mapped[codes]
+
+
+class SparseGasMatrix:
+    """Rows x gases matrix in coordinate form over a GWP.xlsx gas axis.
+
+    ``rows`` and ``gas_codes`` are parallel integer arrays; a gas code of -1
+    marks a gas missing from the axis, which makes its row's products NaN.
+    """
+
+    def __init__(self, rows, gas_codes, values, n_rows, gases):
+        self.rows = np.asarray(rows, dtype=np.int64)
+        self.gas_codes = np.asarray(gas_codes, dtype=np.int64)
+        self.values = np.asarray(values, dtype=float)
+        self.n_rows = n_rows
+        self.gases = list(gases)
+
+    @property
+    def nnz(self):
+        return len(self.values)
+
+    def _extended(self, weights):
+        # Code -1 picks the trailing NaN, so unknown gases poison only their own row
+        weights = np.asarray(weights, dtype=float)
+        return np.concatenate([weights, np.full((1,) + weights.shape[1:], np.nan)])
+
+    def dot(self, weights):
+        """(N,) product with a per-gas weight vector, e.g. one GWP column."""
+        products = self.values * self._extended(weights)[self.gas_codes]
+        return np.bincount(self.rows, weights=products, minlength=self.n_rows)
+
+    def dot_all(self, weights):
+        """(N, K) product with a (G, K) weight matrix, e.g. every GWP report."""
+        weights = np.asarray(weights, dtype=float)
+        return np.column_stack([self.dot(weights[:, k]) for k in range(weights.shape[1])])
+
+
+def gas_matrix(row_labels, gas_names, values, gases):
+    """Sparse matrix from long-form (row label, gas, value) entries.
+
+    Rows are the distinct ``row_labels`` in first-appearance order, which
+    are returned alongside the matrix; repeated (row, gas) entries add up.
+    """
+    rows, labels = pd.factorize(pd.Series(row_labels), use_na_sentinel=False)
+    return SparseGasMatrix(rows, gas_positions(gases, gas_names), values, len(labels), gases), labels
+
+
+def gwp_weights(store, report):
+    """GWP of every gas on the store's GWP.xlsx axis under ``report``; returns (gases, weights)."""
+    gwp = gwp_matrix(store)
+    return list(gwp.gases), gwp.vector(report, gwp.gases)
@@ -0,0 +1,623 @@
+"""Prebuilt lookup indexes over the compiled factor store.
+
+Indexes are built once per store version and shared by every caller in the
+process (the Streamlit UI and the batch paths), so a lookup is a dict read
+instead of a boolean mask over a whole DataFrame. eGRID records are indexed
+one data year at a time and only recently used years are kept.
+
+With ``EF_TOOL_BACKEND=sqlite`` the record lookups (eGRID, GWP, Scope 1 and
+EEI) are answered by ``ef_tool.sqlite_store`` instead; the batch arrays
+always come from the memory-mapped bundle.
+"""
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+from ef_tool.asof import YearTable, key_codes, year_values
+from ef_tool.cache import egrid_year_cache, resident_bytes
+from ef_tool.units import default_registry
+
+egrid_factor_columns = ['CO2 Factor (lb / MWh)', 'CH4 Factor (lb / MWh)', 'N2O Factor (lb / MWh)']
+egrid_provenance_columns = ['eGRID Subregion Name', 'EF Country', 'EF Authority', 'EF Data Year', 'EF Release Year']
+
+gwp_reports = ['SAR', 'AR4', 'AR5', 'AR6']
+# Gas order used by every GWP vector handed to the conversion functions
+main_gases = ('CO2', 'CH4', 'N2O')
+
+_lock = threading.RLock()
+_indexes = {}
+
+
+def _bundle(store):
+    # Imported here: the bundle module builds its arrays with this module's builders
+    from ef_tool.bundle import load_bundle
+    return cached_index('bundle', store, load_bundle)
+
+
+def _sqlite(store):
+    # Imported here: the SQLite module writes its tables with this module's builders
+    from ef_tool.sqlite_store import open_factor_db
+    return cached_index('sqlite', store, open_factor_db)
+
+
+def factor_backend():
+    """'memory' (default) or 'sqlite', from the EF_TOOL_BACKEND environment variable."""
+    return os.environ.get('EF_TOOL_BACKEND', 'memory').strip().lower()
+
+
+def normalize_acronym(acronym):
+    return str(acronym).strip().upper()
+
+
+def cached_index(name, store, builder, depends=None):
+    """Build ``name`` for ``store`` once and share it.
+
+    ``depends`` lists the datasets the index is derived from; it is then
+    reused across store versions that leave those datasets unchanged.
+    Without it the index is tied to the whole store version.
+    """
+    key = (name, store.dataset_key(depends) if depends else store.version)
+    index = _indexes.get(key)
+    if index is None:
+        with _lock:
+            index = _indexes.get(key)
+            if index is None:
+                index = builder(store)
+                # Only the current version of each index is kept
+                for stale in [k for k in _indexes if k[0] == name]:
+                    del _indexes[stale]
+                _indexes[key] = index
+    return index
+
+
+# ---------------------------------------------------------------------------
+# eGRID subregion factors
+
+def build_egrid_index(egrid_df):
+    """Map (normalized acronym, EF category, data year) to a factor record.
+
+    ``egrid_df`` is one year's frame from ``FactorStore.egrid`` or the
+    all-years frame from ``FactorStore.egrid_all``. Each record holds the
+    raw CO2/CH4/N2O factors (lb/MWh) plus provenance fields as plain Python
+    scalars.
+    """
+    columns = ['eGRID Subregion Acronym', 'EF Category', 'Data Year'] + egrid_factor_columns + egrid_provenance_columns
+    index = {}
+    for row in egrid_df[columns].itertuples(index=False, name=None):
+        acronym, category, year = row[:3]
+        record = dict(zip(columns[3:], row[3:]))
+        record['eGRID Subregion Acronym'] = acronym
+        record['EF Category'] = category
+        record['Data Year'] = int(year)
+        for col in egrid_factor_columns:
+            record[col] = float(record[col])
+        for col in ['EF Data Year', 'EF Release Year']:
+            record[col] = int(record[col])
+        # First row wins, matching the .values[0] the app used to take
+        index.setdefault((normalize_acronym(acronym), category, int(year)), record)
+    return index
+
+
+class EGridYear:
+    """One data year's eGRID records, keyed like ``build_egrid_index``, and its subregions in file order.
+
+    The unit ``egrid_year_cache`` keeps per year; ``nbytes`` is its
+    approximate resident size for the cache's memory budget.
+    """
+
+    def __init__(self, records):
+        self.records = records
+        self.acronyms = list(dict.fromkeys(r['eGRID Subregion Acronym'] for r in records.values()))
+        self.nbytes = resident_bytes(records) + resident_bytes(self.acronyms)
+
+    def get(self, key, default=None):
+        return self.records.get(key, default)
+
+
+def _load_egrid_year(path):
+    return EGridYear(build_egrid_index(pd.read_parquet(path)))
+
+
+def egrid_year_index(store, data_year):
+    """The eGRID records of one data year, for ``lookup_egrid``.
+
+    Years are loaded on first use and kept in the bounded, least recently
+    used ``egrid_year_cache``, so switching between recent years costs a
+    dict read; a year with no eGRID data gives an empty index.
+    """
+    if factor_backend() == 'sqlite':
+        return _sqlite(store).egrid
+    year = _year_key(data_year)
+    name = 'egrid_{}'.format(year)
+    if name not in store.datasets:
+        return EGridYear({})
+    return egrid_year_cache.get(name, store.egrid_path(year), _load_egrid_year, version=store.datasets[name])
+
+
+def egrid_acronyms(store, data_year):
+    """eGRID subregion acronyms listed for ``data_year``, in file order, from the configured backend."""
+    if factor_backend() == 'sqlite':
+        return _sqlite(store).egrid.acronyms(data_year)
+    return egrid_year_index(store, data_year).acronyms
+
+
+def lookup_egrid(index, acronym, category, year):
+    """Return the factor record for one subregion, or None if it is not listed."""
+    return index.get((normalize_acronym(acronym), category, int(year)))
+
+
+# ---------------------------------------------------------------------------
+# GWP values
+
+class GWPMatrix:
+    """Dense gas x assessment-report array of GWP.xlsx values.
+
+    Every gas row in the sheet is kept; reports a gas has no value for
+    (e.g. AR6 for the CFCs) hold NaN.
+    """
+
+    def __init__(self, gases, reports, values):
+        self.gases = list(gases)
+        self.reports = list(reports)
+        self.values = np.asarray(values, dtype=float)
+        self.values.setflags(write=False)
+        self._gas_pos = {gas: i for i, gas in enumerate(self.gases)}
+        self._report_pos = {report: j for j, report in enumerate(self.reports)}
+
+    def value(self, gas, report):
+        """GWP of one gas under one assessment report."""
+        return self.values[self._gas_pos[gas], self._report_pos[report]]
+
+    def vector(self, report, gases=main_gases):
+        """GWP values for ``gases`` under ``report``, in that order."""
+        return self.values[[self._gas_pos[gas] for gas in gases], self._report_pos[report]]
+
+
+def build_gwp_matrix(gwp_df):
+    reports = [c for c in gwp_reports if c in gwp_df.columns]
+    gases = gwp_df['Global Warming Potential'].astype(str).str.strip()
+    return GWPMatrix(gases, reports, gwp_df[reports].to_numpy(dtype=float))
+
+
+def gwp_matrix(store):
+    """The GWP matrix for ``store``, memory-mapped from its factor bundle."""
+    if factor_backend() == 'sqlite':
+        return _sqlite(store).gwp
+    return cached_index('gwp', store, lambda s: _bundle(s).gwp_matrix, ['gwp'])
+
+
+# ---------------------------------------------------------------------------
+# Dense eGRID factor cube for batch joins
+
+class EGridCube:
+    """eGRID CO2/CH4/N2O factors as a dense (subregion, category, year, gas) array.
+
+    Batch paths resolve each activity row to integer positions along the
+    first three axes and gather all factors with one fancy-index; missing
+    combinations hold NaN.
+    """
+
+    def __init__(self, acronyms, categories, years, factors):
+        self.acronyms = list(acronyms)
+        self.categories = list(categories)
+        self.years = [int(y) for y in years]
+        self.factors = factors
+        self.factors.setflags(write=False)
+        self._acronym_pos = {a: i for i, a in enumerate(self.acronyms)}
+        self._category_pos = {c: i for i, c in enumerate(self.categories)}
+        self._year_pos = {y: i for i, y in enumerate(self.years)}
+        self._year_table = None
+
+    @property
+    def year_table(self):
+        """As-of table of the data years each (subregion, category) has factors for."""
+        if self._year_table is None:
+            sub, cat, year = np.nonzero(~np.isnan(self.factors).all(axis=-1))
+            self._year_table = YearTable(sub * len(self.categories) + cat, np.asarray(self.years)[year], year)
+        return self._year_table
+
+    def positions(self, acronyms, categories, years):
+        """Integer positions for parallel key arrays; -1 where a key is unknown."""
+        def encode(values, lookup, normalize):
+            codes, uniques = pd.factorize(pd.Series(values), use_na_sentinel=True)
+            mapped = np.array([lookup.get(normalize(u), -1) for u in uniques] + [-1], dtype=np.int64)
+            return mapped[codes]
+        return (encode(acronyms, self._acronym_pos, normalize_acronym),
+                encode(categories, self._category_pos, lambda c: str(c).strip()),
+                encode(years, self._year_pos, _year_key))
+
+    def gather(self, acronyms, categories, years):
+        """(N, 3) raw factors in lb/MWh for N activity keys, NaN where unmatched."""
+        sub, cat, year = self.positions(acronyms, categories, years)
+        found = (sub >= 0) & (cat >= 0) & (year >= 0)
+        out = np.full((len(sub), len(main_gases)), np.nan)
+        out[found] = self.factors[sub[found], cat[found], year[found]]
+        return out
+
+    def gather_years(self, acronyms, categories, years, rule='exact'):
+        """(N, 3) raw factors and (N,) factor data years, with years matched under a ``year_match_rules`` rule.
+
+        Unmatched rows have NaN factors and factor year -1.
+        """
+        sub, cat, _ = self.positions(acronyms, categories, years)
+        entities = np.where((sub >= 0) & (cat >= 0), sub * len(self.categories) + cat, -1)
+        year, factor_years = self.year_table.match(entities, year_values(years), rule)
+        found = year >= 0
+        out = np.full((len(sub), len(main_gases)), np.nan)
+        out[found] = self.factors[sub[found], cat[found], year[found]]
+        return out, factor_years
+
+
+def _year_key(value):
+    try:
+        return int(float(value))
+    except (TypeError, ValueError):
+        return None
+
+
+def build_egrid_cube(index):
+    keys = list(index)
+    acronyms = sorted({k[0] for k in keys})
+    categories = sorted({k[1] for k in keys})
+    years = sorted({k[2] for k in keys})
+    factors = np.full((len(acronyms), len(categories), len(years), len(main_gases)), np.nan)
+    a_pos = {a: i for i, a in enumerate(acronyms)}
+    c_pos = {c: i for i, c in enumerate(categories)}
+    y_pos = {y: i for i, y in enumerate(years)}
+    for (acronym, category, year), record in index.items():
+        factors[a_pos[acronym], c_pos[category], y_pos[year]] = [record[col] for col in egrid_factor_columns]
+    return EGridCube(acronyms, categories, years, factors)
+
+
+def egrid_cube(store):
+    """The eGRID factor cube for ``store``, memory-mapped from its factor bundle."""
+    return cached_index('egrid_cube', store, lambda s: _bundle(s).egrid_cube, store.egrid_datasets)
+
+
+# ---------------------------------------------------------------------------
+# Scope 1 stationary combustion factors
+
+scope_1_fuel_column = 'Stationary combustion fuel'
+scope_1_factor_columns = ['CO2 Factor (kg/ mmBtu)', 'CH4 Factor (g/ mmBtu)', 'N2O Factor (g / mmBtu)']
+
+
+def normalize_fuel(fuel):
+    return ' '.join(str(fuel).split()).casefold()
+
+
+class Scope1Factors:
+    """Scope 1 CO2 (kg/mmBtu), CH4 and N2O (g/mmBtu) factors as an (F, 3) array."""
+
+    def __init__(self, fuels, factors):
+        self.fuels = list(fuels)
+        self.factors = np.asarray(factors, dtype=float)
+        self.factors.setflags(write=False)
+        self._fuel_pos = {}
+        for i, fuel in enumerate(self.fuels):
+            self._fuel_pos.setdefault(normalize_fuel(fuel), i)
+
+    def positions(self, fuels):
+        """Row positions for an array of fuel names; -1 where a fuel is unknown."""
+        codes, uniques = pd.factorize(pd.Series(fuels), use_na_sentinel=True)
+        mapped = np.array([self._fuel_pos.get(normalize_fuel(u), -1) for u in uniques] + [-1], dtype=np.int64)
+        return mapped[codes]
+
+
+def build_scope_1_factors(scope_1_df):
+    return Scope1Factors(scope_1_df[scope_1_fuel_column], scope_1_df[scope_1_factor_columns].to_numpy(dtype=float))
+
+
+def scope_1_factors(store):
+    """The Scope 1 factor array for ``store``, memory-mapped from its factor bundle."""
+    return cached_index('scope_1', store, lambda s: _bundle(s).scope_1_factors, ['scope_1'])
+
+
+class HeatContent:
+    """Higher heating values per fuel, for normalizing Scope 1 activity to mmBtu.
+
+    Each fuel has at most one heating value per physical dimension (e.g.
+    mmBtu/scf and MJ/kg); a quantity in any registry unit of that dimension
+    converts through it, and energy quantities convert directly.
+    """
+
+    def __init__(self, values, registry):
+        self._values = values
+        self.registry = registry
+
+    def units(self, fuel):
+        """Quantity units accepted for ``fuel``: every energy unit, plus those its heating values cover."""
+        dimensions = ['energy'] + [dim for (name, dim) in self._values if name == normalize_fuel(fuel)]
+        return [unit for dim in dimensions for unit in self.registry.units(dim)]
+
+    def mmbtu_per_unit(self, fuel, unit):
+        """mmBtu per one ``unit`` of ``fuel``; NaN for an unknown unit or a fuel without that dimension."""
+        try:
+            dimension = self.registry.dimension(unit)
+            if dimension == 'energy':
+                return self.registry.factor(str(unit), 'mmBtu')
+            value, value_unit = self._values[(normalize_fuel(fuel), dimension)]
+            return value * self.registry.factor(value_unit, 'mmBtu/' + str(unit))
+        except (KeyError, ValueError):
+            return np.nan
+
+    def mmbtu_factors(self, fuels, units):
+        """Per-row mmBtu per unit for arrays of fuel names and quantity units.
+
+        Rows are factorized to distinct (fuel, unit) pairs, so each pair is
+        resolved once and the result is gathered with one array index.
+        """
+        fuel_codes, fuel_uniques = pd.factorize(pd.Series(fuels), use_na_sentinel=True)
+        unit_codes, unit_uniques = pd.factorize(pd.Series(units), use_na_sentinel=True)
+        # Shift codes by one so missing fuels or units (-1) decode to -1 again
+        width = len(unit_uniques) + 1
+        pair_codes, pairs = pd.factorize((fuel_codes.astype(np.int64) + 1) * width + unit_codes + 1)
+        mapped = np.full(len(pairs), np.nan)
+        for i, pair in enumerate(pairs):
+            fuel_code, unit_code = divmod(int(pair), width)
+            if fuel_code > 0 and unit_code > 0:
+                mapped[i] = self.mmbtu_per_unit(fuel_uniques[fuel_code - 1], unit_uniques[unit_code - 1])
+        return mapped[pair_codes]
+
+
+def build_heat_content(heat_content_df, registry=None):
+    registry = registry or default_registry()
+    values = {}
+    for fuel, value, unit in heat_content_df[['fuel', 'heat_content', 'heat_content_unit']].itertuples(index=False):
+        dimension = registry.dimension(unit.split('/')[-1])
+        if values.setdefault((normalize_fuel(fuel), dimension), (float(value), unit)) != (float(value), unit):
+            raise ValueError('More than one {} heat content for {}'.format(dimension, fuel))
+    return HeatContent(values, registry)
+
+
+def heat_content(store):
+    """Fuel heating values for ``store``, built on first use for its heat content data."""
+    return cached_index('heat_content', store, lambda s: build_heat_content(s.heat_content), ['heat_content'])
+
+
+# ---------------------------------------------------------------------------
+# EEI market-based records
+
+class MarketIndex:
+    """Nested state -> company -> data year -> record index over the EEI data.
+
+    Companies and years keep the order they first appear in the file, which
+    is the order the app's dropdowns used to show.
+    """
+
+    def __init__(self, tree):
+        self._tree = tree
+        self.states = sorted(state for state in tree if isinstance(state, str) and state.lower() != 'nan')
+
+    def companies(self, state):
+        return list(self._tree.get(state, {}))
+
+    def years(self, state, company):
+        return list(self._tree.get(state, {}).get(company, {}))
+
+    def record(self, state, company, year):
+        """The EEI record for one utility and year, or None."""
+        return self._tree.get(state, {}).get(company, {}).get(year)
+
+
+def build_market_index(market_df):
+    tree = {}
+    columns = list(market_df.columns)
+    for row in market_df.itertuples(index=False, name=None):
+        record = dict(zip(columns, row))
+        years = tree.setdefault(record['state'], {}).setdefault(record['company_name'], {})
+        # First row wins, matching the .values[0] the app used to take
+        years.setdefault(int(record['data_year']), record)
+    return MarketIndex(tree)
+
+
+def market_index(store):
+    """The EEI market index for ``store``, built on first use for its version."""
+    if factor_backend() == 'sqlite':
+        return _sqlite(store).market
+    return cached_index('market', store, lambda s: build_market_index(s.market), ['market'])
+
+
+eei_rate_columns = ['utility_specific_residual_mix_emission_rate', 'utility_avg_emission_rate']
+
+# Where a record's market-based CO2 rate comes from, in fallback order; 'none' when nothing applies
+market_rate_sources = ['residual_mix', 'utility_average', 'egrid_subregion', 'none']
+
+# eGRID category for market-based fallbacks and CH4/N2O when the activity does not name one
+default_ef_category = 'Total Output Emission Factors'
+
+
+def normalize_state(state):
+    return str(state).strip().upper()
+
+
+class EEIRates:
+    """EEI residual mix and utility average rates as an (R, 2) lbs CO2/MWh array.
+
+    Batch paths resolve (state, utility, data year) keys to row positions;
+    the first record for a key wins, as in ``MarketIndex``. Each record also
+    carries its resolved market-based CO2 rate (``resolved``) and a
+    ``market_rate_sources`` code (``source_codes``) saying which fallback
+    level supplied it.
+    """
+
+    def __init__(self, states, companies, years, rates, subregions=None, resolved=None, source_codes=None):
+        self.rates = rates
+        self.rates.setflags(write=False)
+        # eGRID subregion acronym of each record (None when unmapped), for its CH4/N2O
+        self.subregions = np.array(list(subregions) if subregions is not None else [None] * len(rates), dtype=object)
+        if resolved is None:
+            resolved, source_codes = resolve_market_rates(rates, np.full(len(rates), np.nan))
+        self.resolved = resolved
+        self.source_codes = source_codes
+        self._pos = {}
+        self._entity_pos = {}
+        years = list(years)
+        entities = np.empty(len(years), dtype=np.int64)
+        for i, key in enumerate(zip(states, companies, years)):
+            state, company, year = self._key(*key)
+            self._pos.setdefault((state, company, year), i)
+            entities[i] = self._entity_pos.setdefault((state, company), len(self._entity_pos))
+        # Data years each state/utility reported, for as-of year matching
+        self.year_table = YearTable(entities, year_values(years), np.arange(len(years)))
+
+    @staticmethod
+    def _key(state, company, year):
+        return normalize_state(state), normalize_fuel(company), _year_key(year)
+
+    def positions(self, states, companies, years):
+        """Row positions for parallel key arrays; -1 where a key is unknown or a part is missing."""
+        return key_codes([states, companies, years],
+                         lambda state, company, year: self._pos.get(self._key(state, company, year), -1))
+
+    def match_positions(self, states, companies, years, rule='exact'):
+        """Row positions and EEI data years for keys, with years matched under a ``year_match_rules`` rule.
+
+        Both are -1 where the state/utility is unknown or no reported year
+        satisfies the rule.
+        """
+        entities = key_codes([states, companies], lambda state, company: self._entity_pos.get(
+            (normalize_state(state), normalize_fuel(company)), -1))
+        return self.year_table.match(entities, year_values(years), rule)
+
+    def gather_resolved(self, pos):
+        """Resolved CO2 rates and source codes for record positions; NaN and 'none' where ``pos`` is -1."""
+        found = pos >= 0
+        rate = np.full(len(pos), np.nan)
+        rate[found] = self.resolved[pos[found]]
+        codes = np.full(len(pos), market_rate_sources.index('none'), dtype=np.int8)
+        codes[found] = self.source_codes[pos[found]]
+        return rate, codes
+
+    def gather_subregions(self, pos):
+        """eGRID subregion acronyms for record positions; None where ``pos`` is -1 or unmapped."""
+        return np.where(pos >= 0, self.subregions[np.maximum(pos, 0)], None)
+
+
+def resolve_market_rates(rates, egrid_co2):
+    """Market-based CO2 rate per record: residual mix, then utility average, then eGRID ``egrid_co2``.
+
+    ``rates`` is the (R, 2) EEI array; returns the (R,) rates and int8
+    ``market_rate_sources`` codes.
+    """
+    candidates = np.column_stack([rates[:, 0], rates[:, 1], egrid_co2])
+    available = ~np.isnan(candidates)
+    codes = np.where(available.any(axis=1), available.argmax(axis=1), market_rate_sources.index('none'))
+    resolved = np.full(len(candidates), np.nan)
+    found = codes < candidates.shape[1]
+    resolved[found] = candidates[found, codes[found]]
+    return resolved, codes.astype(np.int8)
+
+
+def build_eei_rates(market_df, subregion_map=None, cube=None):
+    """EEI rate array for ``market_df``.
+
+    With ``subregion_map`` each record gets its eGRID subregion, and with
+    the eGRID ``cube`` as well the subregion's CO2 factor becomes the last
+    level of the rate fallback.
+    """
+    rates = market_df[eei_rate_columns].apply(pd.to_numeric, errors='coerce').to_numpy(dtype=float)
+    subregions = None
+    egrid_co2 = np.full(len(rates), np.nan)
+    if subregion_map is not None:
+        mapping = build_market_subregions(subregion_map)
+        subregions = [mapping.subregion(state, company)[0]
+                      for state, company in zip(market_df['state'], market_df['company_name'])]
+        if cube is not None:
+            categories = np.full(len(rates), default_ef_category, dtype=object)
+            egrid_co2 = cube.gather(np.array(subregions, dtype=object), categories,
+                                    market_df['data_year'].to_numpy())[:, 0]
+    resolved, source_codes = resolve_market_rates(rates, egrid_co2)
+    return EEIRates(market_df['state'], market_df['company_name'], market_df['data_year'], rates, subregions,
+                    resolved, source_codes)
+
+
+def eei_rates(store):
+    """The EEI rate array for ``store``, memory-mapped from its factor bundle."""
+    return cached_index('eei_rates', store, lambda s: _bundle(s).eei_rates,
+                        ['market', 'subregion_map'] + store.egrid_datasets)
+
+
+class MarketSubregions:
+    """eGRID subregion of each EEI utility, for the CH4 and N2O factors EEI does not publish.
+
+    A mapping row for the utility itself wins; otherwise the default of the
+    first state the record lists (EEI records can span "NC/SC").
+    """
+
+    def __init__(self, utilities, states):
+        self._utilities = utilities
+        self._states = states
+
+    def subregion(self, state, company):
+        """(acronym, 'utility' or 'state'), or (None, None) when neither is mapped."""
+        acronym = self._utilities.get((normalize_state(state), normalize_fuel(company)))
+        if acronym:
+            return acronym, 'utility'
+        for part in str(state).replace(',', '/').split('/'):
+            acronym = self._states.get(normalize_state(part))
+            if acronym:
+                return acronym, 'state'
+        return None, None
+
+
+def build_market_subregions(map_df):
+    utilities, states = {}, {}
+    for state, company, acronym in map_df[['state', 'company_name', 'egrid_subregion']].itertuples(index=False):
+        if company:
+            utilities.setdefault((normalize_state(state), normalize_fuel(company)), normalize_acronym(acronym))
+        else:
+            states.setdefault(normalize_state(state), normalize_acronym(acronym))
+    return MarketSubregions(utilities, states)
+
+
+def market_subregions(store):
+    """The utility/state to eGRID subregion mapping for ``store``."""
+    return cached_index('market_subregions', store, lambda s: build_market_subregions(s.subregion_map),
+                        ['subregion_map'])
+
+
+class Scope1Index:
+    """Fuel-keyed Scope 1 records, built once per Scope 1 dataset.
+
+    Records are keyed by normalized fuel name and by (fuel, combustion type),
+    and hold float factors and plain provenance values, so a lookup needs no
+    casting.
+    """
+
+    def __init__(self, records):
+        self._records = list(records)
+        self.fuels = []
+        self._by_fuel = {}
+        self._by_fuel_type = {}
+        for record in records:
+            fuel = normalize_fuel(record[scope_1_fuel_column])
+            if fuel not in self._by_fuel:
+                self.fuels.append(record[scope_1_fuel_column])
+                self._by_fuel[fuel] = record
+            self._by_fuel_type.setdefault((fuel, normalize_fuel(record['Combustion Type'])), record)
+
+    def record(self, fuel, combustion_type=None):
+        """The record for ``fuel`` (optionally of one combustion type), or None."""
+        if combustion_type is None:
+            return self._by_fuel.get(normalize_fuel(fuel))
+        return self._by_fuel_type.get((normalize_fuel(fuel), normalize_fuel(combustion_type)))
+
+
+def build_scope_1_index(scope_1_df):
+    records = []
+    for row in scope_1_df.to_dict('records'):
+        record = {key: (None if value is pd.NA else value.item() if isinstance(value, np.generic) else value)
+                  for key, value in row.items()}
+        for col in scope_1_factor_columns:
+            record[col] = float(record[col])
+        records.append(record)
+    return Scope1Index(records)
+
+
+def scope_1_index(store):
+    """The Scope 1 fuel index for ``store``, built on first use for its Scope 1 data."""
+    if factor_backend() == 'sqlite':
+        return _sqlite(store).scope_1
+    return cached_index('scope_1_index', store, lambda s: build_scope_1_index(s.scope_1), ['scope_1'])
@@ -0,0 +1,269 @@
+"""EEI utility database ingest.
+
+Replaces the hand-run EEI_data_cleaning.ipynb: reads the raw EEI workbook in
+openpyxl read-only (streaming) mode, keeps the eight columns the
+market-based section uses, applies the column cleaning the app used to redo
+on every rerun and writes a typed Parquet file the factor store compiles.
+
+With ``--incremental`` a new release (workbook, or an already cleaned CSV or
+Parquet file such as EEI_clean_old.csv) is diffed against the current file
+by (company, state, data year) and only the inserts, updates and deletes
+are applied. Untouched rows are kept as they were, and if nothing changed
+the file is not rewritten, so the factor store and its caches stay valid.
+
+Run from the repository root::
+
+    python -m ef_tool.ingest "EEI_UtilityCO2EmissionsDatabase April 2024.xlsx"
+    python -m ef_tool.ingest new_release.xlsx --incremental --report changes.json
+"""
+import argparse
+import json
+import os
+import warnings
+
+import numpy as np
+import openpyxl
+import pandas as pd
+
+from ef_tool.store import BASE_DIR, market_columns, market_file_path
+
+eei_sheet_name = 'Quantitative Electric Co Data'
+
+# Normalized header prefix -> clean column name, in market_columns order
+eei_header_prefixes = [
+    ('company name', 'company_name'),
+    ('state', 'state'),
+    ('data year', 'data_year'),
+    ('utility specific residual mix emissions rate', 'utility_specific_residual_mix_emission_rate'),
+    ('utility average emissions rate', 'utility_avg_emission_rate'),
+    ('protocol', 'protocol'),
+    ('emissions certified', 'emissions_certified'),
+    ('emission totals', 'emission_totals_intensity'),
+]
+
+market_key_columns = ['company_name', 'state', 'data_year']
+market_value_columns = [c for c in market_columns if c not in market_key_columns]
+
+rate_columns = ['utility_specific_residual_mix_emission_rate', 'utility_avg_emission_rate']
+text_columns = ['company_name', 'state', 'protocol', 'emissions_certified', 'emission_totals_intensity']
+
+
+def normalize_header(value):
+    return ' '.join(str(value).split()).lower() if value is not None else ''
+
+
+def _column_positions(header):
+    normalized = [normalize_header(h) for h in header]
+    positions = {}
+    for prefix, name in eei_header_prefixes:
+        matches = [i for i, h in enumerate(normalized) if h.startswith(prefix)]
+        if not matches:
+            raise ValueError('EEI header has no column starting with "{}"'.format(prefix))
+        positions[name] = matches[0]
+    return positions
+
+
+def iter_eei_rows(workbook_path, sheet_name=eei_sheet_name):
+    """Yield dicts of the market columns, streaming the sheet row by row."""
+    wb = openpyxl.load_workbook(workbook_path, read_only=True, data_only=True)
+    try:
+        positions = None
+        with warnings.catch_warnings():
+            # The EEI workbook uses a data-validation extension openpyxl does not read
+            warnings.simplefilter('ignore', UserWarning)
+            for row in wb[sheet_name].iter_rows(values_only=True):
+                if positions is None:
+                    # The header row is the first one naming the company column
+                    if any(normalize_header(v) == 'company name' for v in row):
+                        positions = _column_positions(row)
+                    continue
+                if all(v is None for v in row):
+                    continue
+                yield {name: (row[i] if i < len(row) else None) for name, i in positions.items()}
+    finally:
+        wb.close()
+
+
+def _clean_text(value):
+    if value is None or (isinstance(value, float) and np.isnan(value)):
+        return None
+    return ' '.join(str(value).split()) or None
+
+
+def clean_market_frame(df_market):
+    """Type the market columns: int data year, float rates, stripped text.
+
+    Rows with neither a state nor a data year (the source/contact footer of
+    the EEI sheet) are dropped.
+    """
+    df_market = df_market.reindex(columns=market_columns)
+    df_market['data_year'] = pd.to_numeric(df_market['data_year'], errors='coerce').fillna(0).astype(int)
+    for col in rate_columns:
+        # Placeholders such as '--' and 'N/A' become NaN
+        df_market[col] = pd.to_numeric(df_market[col], errors='coerce').astype(float)
+    for col in text_columns:
+        df_market[col] = [_clean_text(v) for v in df_market[col]]
+    footer = df_market['state'].isna() & (df_market['data_year'] == 0)
+    return df_market[~footer].reset_index(drop=True)
+
+
+def read_eei_workbook(workbook_path, sheet_name=eei_sheet_name):
+    return clean_market_frame(pd.DataFrame(list(iter_eei_rows(workbook_path, sheet_name)), columns=market_columns))
+
+
+def read_eei_release(path):
+    """Read an EEI release: a raw workbook, or a cleaned CSV/Parquet file."""
+    ext = os.path.splitext(path)[1].lower()
+    if ext in ('.xlsx', '.xlsm'):
+        return read_eei_workbook(path)
+    df = pd.read_parquet(path) if ext in ('.parquet', '.pq') else pd.read_csv(path)
+    if list(df.columns) != market_columns:
+        positions = _column_positions(df.columns)
+        df = pd.DataFrame({name: df.iloc[:, positions[name]].to_numpy(dtype=object) for name in market_columns})
+    return clean_market_frame(df)
+
+
+def write_market_parquet(df_market, output_path):
+    tmp_path = output_path + '.tmp'
+    df_market.to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, output_path)
+
+
+def ingest_eei(workbook_path, output_path=None):
+    """Ingest one EEI release into the typed Parquet file the store reads."""
+    output_path = output_path or os.path.join(BASE_DIR, market_file_path)
+    df_market = read_eei_release(workbook_path)
+    write_market_parquet(df_market, output_path)
+    return df_market
+
+
+# ---------------------------------------------------------------------------
+# Incremental releases
+
+def _keyed(df):
+    duplicated = df.duplicated(market_key_columns)
+    if duplicated.any():
+        raise ValueError('Duplicate (company, state, data year) keys: {}'.format(
+            df.loc[duplicated, market_key_columns].to_dict('records')[:5]))
+    return df.set_index(market_key_columns)
+
+
+def diff_market(current, new):
+    """Row-level differences between two cleaned EEI frames.
+
+    Returns a dict with ``inserts`` and ``deletes`` (rows only in ``new`` or
+    only in ``current``), ``updates`` (the new version of rows whose values
+    changed), ``updated_columns`` (key -> changed column names) and the
+    ``unchanged`` row count.
+    """
+    cur, nxt = _keyed(current), _keyed(new)
+    insert_keys = nxt.index.difference(cur.index, sort=False)
+    delete_keys = cur.index.difference(nxt.index, sort=False)
+    common = cur.index.intersection(nxt.index, sort=False)
+
+    old_values = cur.loc[common, market_value_columns]
+    new_values = nxt.loc[common, market_value_columns]
+    same = (old_values == new_values) | (old_values.isna() & new_values.isna())
+    changed = ~same.to_numpy()
+    changed_rows = changed.any(axis=1)
+    updated_columns = {key: [col for col, flag in zip(market_value_columns, flags) if flag]
+                       for key, flags in zip(common[changed_rows], changed[changed_rows])}
+
+    return {
+        'inserts': nxt.loc[insert_keys].reset_index(),
+        'updates': new_values[changed_rows].reset_index(),
+        'updated_columns': updated_columns,
+        'deletes': cur.loc[delete_keys].reset_index(),
+        'unchanged': int((~changed_rows).sum()),
+    }
+
+
+def has_changes(changes):
+    return any(len(changes[kind]) for kind in ('inserts', 'updates', 'deletes'))
+
+
+def apply_market_changes(current, changes):
+    """Apply a ``diff_market`` result to ``current`` without touching other rows.
+
+    Row order is preserved; inserts are appended at the end.
+    """
+    result = current.reset_index(drop=True).copy()
+    keys = pd.MultiIndex.from_frame(result[market_key_columns])
+    if len(changes['updates']):
+        positions = keys.get_indexer(pd.MultiIndex.from_frame(changes['updates'][market_key_columns]))
+        for col in market_value_columns:
+            values = result[col].to_numpy(dtype=object if result[col].dtype == object else None, copy=True)
+            values[positions] = changes['updates'][col].to_numpy()
+            result[col] = values
+    if len(changes['deletes']):
+        result = result[~keys.isin(pd.MultiIndex.from_frame(changes['deletes'][market_key_columns]))]
+    result = pd.concat([result, changes['inserts'][market_columns]], ignore_index=True)
+    return clean_market_frame(result)
+
+
+def _json_value(value):
+    if value is None or (isinstance(value, float) and np.isnan(value)):
+        return None
+    return value.item() if isinstance(value, np.generic) else value
+
+
+def change_report(changes, source):
+    """JSON-serializable summary of a ``diff_market`` result."""
+    rows = []
+    for kind, change in (('insert', 'inserts'), ('update', 'updates'), ('delete', 'deletes')):
+        for record in changes[change].to_dict('records'):
+            key = tuple(record[col] for col in market_key_columns)
+            row = {'change': kind}
+            row.update({col: _json_value(record[col]) for col in market_key_columns})
+            if kind == 'update':
+                row['columns'] = changes['updated_columns'][key]
+            rows.append(row)
+    return {
+        'source': source,
+        'inserted': len(changes['inserts']),
+        'updated': len(changes['updates']),
+        'deleted': len(changes['deletes']),
+        'unchanged': changes['unchanged'],
+        'changes': rows,
+    }
+
+
+def ingest_eei_incremental(release_path, output_path=None):
+    """Diff a release against the current file and apply only the changes.
+
+    Returns the change report. When nothing changed the output file is left
+    untouched; when there is no current file the release is written in full.
+    """
+    output_path = output_path or os.path.join(BASE_DIR, market_file_path)
+    new = read_eei_release(release_path)
+    current = clean_market_frame(pd.read_parquet(output_path)) if os.path.exists(output_path) else new.iloc[:0]
+    changes = diff_market(current, new)
+    if has_changes(changes):
+        write_market_parquet(apply_market_changes(current, changes), output_path)
+    return change_report(changes, release_path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Ingest an EEI utility CO2 emissions workbook.')
+    parser.add_argument('workbook', help='raw EEI workbook (.xlsx), or a cleaned CSV/Parquet release')
+    parser.add_argument('--output', default=os.path.join(BASE_DIR, market_file_path),
+                        help='typed Parquet output (default: %(default)s)')
+    parser.add_argument('--incremental', action='store_true',
+                        help='apply only the differences against the current output')
+    parser.add_argument('--report', help='write the change report as JSON to this path')
+    args = parser.parse_args(argv)
+    if args.incremental:
+        report = ingest_eei_incremental(args.workbook, args.output)
+        if args.report:
+            with open(args.report, 'w') as f:
+                json.dump(report, f, indent=2)
+        print('{inserted} inserted, {updated} updated, {deleted} deleted, {unchanged} unchanged'.format(**report))
+        return
+    df_market = ingest_eei(args.workbook, args.output)
+    print('Wrote {:,} EEI records ({} utilities, years {}-{}) to {}'.format(
+        len(df_market), df_market['company_name'].nunique(),
+        df_market['data_year'].min(), df_market['data_year'].max(), args.output))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,115 @@
+"""Materialized eGRID factor table for every selectable combination.
+
+Every subregion x EF category x data year x GWP set x output unit the
+location-based section can show is precomputed into one table, so UI and
+API lookups are reads instead of conversions. Lookups read one data year
+of it at a time and keep recently used years in the bounded
+``materialized_year_cache``. The table is stored under
+``factor_store/derived/`` keyed by the eGRID and GWP dataset hashes and the
+output unit factors, so it survives store rebuilds that only touch other
+datasets (e.g. a new EEI release) but not a change to the unit registry.
+
+Build it and print rebuild time and size with::
+
+    python -m ef_tool.materialize
+"""
+import glob
+import hashlib
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from ef_tool.cache import materialized_year_cache
+from ef_tool.calc import conversion_factors_1
+from ef_tool.index import cached_index, egrid_cube, gwp_matrix, normalize_acronym
+from ef_tool.store import load_factor_store
+
+materialized_name = 'materialized_factors'
+materialized_key_columns = ['egrid_subregion', 'ef_category', 'data_year', 'gwp_set', 'output_unit']
+materialized_value_columns = ['co2', 'ch4', 'n2o', 'total_co2e']
+
+
+def build_materialized_factors(store):
+    """Compute the full cross product as one compact DataFrame."""
+    cube = egrid_cube(store)
+    gwp = gwp_matrix(store)
+    units = list(conversion_factors_1)
+    gwp_sets = gwp.reports
+    gwp_vectors = np.stack([gwp.vector(report) for report in gwp_sets])              # (G, 3)
+    unit_factors = np.array([conversion_factors_1[unit] for unit in units])          # (K,)
+
+    # (S, C, Y, 1, 1, 3) * (G, 1, 3) * (K, 1) -> (S, C, Y, G, K, 3)
+    converted = (cube.factors[:, :, :, None, None, :] * gwp_vectors[:, None, :] * unit_factors[:, None])
+    shape = converted.shape[:-1]
+    keys = np.indices(shape).reshape(len(shape), -1)
+    values = converted.reshape(-1, 3)
+    found = ~np.isnan(values).any(axis=1)
+    keys, values = keys[:, found], values[found]
+
+    df = pd.DataFrame({
+        'egrid_subregion': pd.Categorical.from_codes(keys[0], cube.acronyms),
+        'ef_category': pd.Categorical.from_codes(keys[1], cube.categories),
+        'data_year': np.asarray(cube.years, dtype=np.int16)[keys[2]],
+        'gwp_set': pd.Categorical.from_codes(keys[3], gwp_sets),
+        'output_unit': pd.Categorical.from_codes(keys[4], units),
+        'co2': values[:, 0],
+        'ch4': values[:, 1],
+        'n2o': values[:, 2],
+        'total_co2e': values.sum(axis=1),
+    })
+    return df
+
+
+def materialize(store=None):
+    """Build and write the table for ``store``; returns (path, seconds, rows, bytes)."""
+    store = store or load_factor_store()
+    start = time.perf_counter()
+    df = build_materialized_factors(store)
+    path = _materialized_path(store)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + '.tmp'
+    df.to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, path)
+    # Drop tables built from superseded eGRID/GWP data
+    for old_path in glob.glob(os.path.join(os.path.dirname(path), materialized_name + '-*.parquet')):
+        if old_path != path:
+            os.remove(old_path)
+    return path, time.perf_counter() - start, len(df), os.path.getsize(path)
+
+
+def _materialized_depends(store):
+    return store.egrid_datasets + ['gwp']
+
+
+def _units_key():
+    return hashlib.sha256(repr(sorted(conversion_factors_1.items())).encode()).hexdigest()[:12]
+
+
+def _materialized_path(store):
+    return store.derived_path('{}-{}'.format(materialized_name, _units_key()), _materialized_depends(store))
+
+
+def _read_year(store, path, data_year):
+    # Dict from (acronym, category, GWP set, unit) to (co2, ch4, n2o, total) for one data year
+    if not os.path.exists(path):
+        materialize(store)
+    df = pd.read_parquet(path, filters=[('data_year', '==', data_year)])
+    keys = zip(*(df[col].astype(object) for col in materialized_key_columns if col != 'data_year'))
+    return dict(zip(keys, df[materialized_value_columns].itertuples(index=False, name=None)))
+
+
+def lookup_materialized(store, acronym, category, data_year, gwp_set, unit):
+    """Converted (co2, ch4, n2o, total) for one combination, or None."""
+    year = int(data_year)
+    # The path carries the eGRID/GWP and unit hashes, so it versions the entry
+    path = cached_index('materialized_path', store, _materialized_path)
+    factors = materialized_year_cache.get('{}_{}'.format(materialized_name, year), path,
+                                          lambda p: _read_year(store, p, year), version=path)
+    return factors.get((normalize_acronym(acronym), category, gwp_set, unit))
+
+
+if __name__ == '__main__':
+    path, seconds, rows, size = materialize()
+    print('Materialized {:,} rows in {:.3f} s -> {} ({:,} bytes on disk)'.format(rows, seconds, path, size))
@@ -0,0 +1,64 @@
+"""Matrix engine for GWP-set and output-unit sensitivity.
+
+Sensitivity reporting shows every GWP set (SAR, AR4, AR5, AR6) in every
+output unit for each row. Rather than one ``convert_to_unit`` call per
+combination, the GWP sets and unit factors are folded into one G x (K*U)
+weight matrix, so CO2e for all N rows and all K*U combinations is a single
+(N, G) @ (G, K*U) matrix product (one BLAS call).
+"""
+import numpy as np
+
+from ef_tool.calc import scope_1_gas_mass_factors, scope_1_output_units, scope_2_output_units, stack_gases
+from ef_tool.index import gwp_matrix, main_gases
+from ef_tool.units import conversion_factor
+
+
+def gwp_set_matrix(store, reports=None, gases=main_gases):
+    """(G, K) GWP values of ``gases`` under each report (every GWP.xlsx report by default)."""
+    gwp = gwp_matrix(store)
+    reports = list(reports or gwp.reports)
+    return np.column_stack([gwp.vector(report, gases) for report in reports]), reports
+
+
+def weight_matrix(gwp_sets, unit_factors, gas_factors=None):
+    """(G, K*U) weights: GWP of gas g in set k times unit factor u, laid out set-major.
+
+    ``gas_factors`` optionally rescales each gas first (e.g. g -> kg for
+    the Scope 1 CH4 and N2O factors).
+    """
+    weights = np.asarray(gwp_sets, dtype=float)[:, :, None] * np.asarray(unit_factors, dtype=float)
+    if gas_factors is not None:
+        weights = weights * np.asarray(gas_factors, dtype=float)[:, None, None]
+    return weights.reshape(len(weights), -1)
+
+
+def co2e_all(factors, gwp_sets, unit_factors, gas_factors=None):
+    """(N, K, U) CO2e of (N, G) per-gas factors under each of K GWP sets and U unit factors."""
+    factors = np.asarray(factors, dtype=float).reshape(-1, np.shape(gwp_sets)[0])
+    weights = weight_matrix(gwp_sets, unit_factors, gas_factors)
+    return (factors @ weights).reshape(len(factors), np.shape(gwp_sets)[1], len(unit_factors))
+
+
+def scope_2_sensitivity(co2, ch4, n2o, store, reports=None, units=None):
+    """CO2e of eGRID lb/MWh factors (scalars or arrays) for every GWP set and output unit.
+
+    ``units`` are any registry per-energy units (``scope_2_output_units`` by
+    default). Returns (co2e (N, K, U), reports, units).
+    """
+    units = list(units or scope_2_output_units)
+    gwp_sets, reports = gwp_set_matrix(store, reports)
+    co2e = co2e_all(stack_gases(co2, ch4, n2o), gwp_sets, [conversion_factor('lb/MWh', unit) for unit in units])
+    return co2e, reports, units
+
+
+def scope_1_sensitivity(co2, ch4, n2o, store, reports=None, units=None):
+    """CO2e of Scope 1 per-mmBtu factors for every GWP set and output unit.
+
+    ``units`` are any registry per-energy units (``scope_1_output_units`` by
+    default). Returns (co2e (N, K, U), reports, units).
+    """
+    units = list(units or scope_1_output_units)
+    gwp_sets, reports = gwp_set_matrix(store, reports)
+    co2e = co2e_all(stack_gases(co2, ch4, n2o), gwp_sets, [conversion_factor('kg/mmBtu', unit) for unit in units],
+                    scope_1_gas_mass_factors)
+    return co2e, reports, units
@@ -0,0 +1,158 @@
+"""Parallel portfolio runs over a process pool.
+
+A portfolio is a set of activity tables, one per calculator (Scope 1
+stationary, Scope 2 location-based, Scope 2 market-based, or both Scope 2
+methods in one pass). Each table is
+split into partitions by site or by data year, so all rows of a site (or a
+year) land in the same task; the tasks run on a process pool whose workers
+each open the factor store once and memory-map the shared, read-only factor
+bundle. Results are merged back in the original row order, so the output is
+identical for any worker count.
+
+Run a portfolio from the command line, or add ``--scaling`` to report
+throughput for 1, 2, 4, ... workers::
+
+    python -m ef_tool.parallel --scope-2-location meters.csv --scope-2-market meters_mb.csv --output-dir results/
+"""
+import argparse
+import functools
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from ef_tool.asof import year_match_rules
+from ef_tool.batch import (batch_output_units, calculate_scope_1_stationary, calculate_scope_2_dual,
+                           calculate_scope_2_location, calculate_scope_2_market, read_activity)
+from ef_tool.bundle import load_bundle
+from ef_tool.store import STORE_DIR, load_factor_store
+
+portfolio_calculators = {
+    'scope_1_stationary': calculate_scope_1_stationary,
+    'scope_2_location': calculate_scope_2_location,
+    'scope_2_market': calculate_scope_2_market,
+    'scope_2_dual': calculate_scope_2_dual,
+}
+
+_worker_store = None
+
+
+def _init_worker(store_dir):
+    global _worker_store
+    _worker_store = load_factor_store(store_dir, rebuild_if_stale=False)
+
+
+def _calculator(kind, year_match):
+    # Scope 1 factors have no data year to match
+    if kind == 'scope_1_stationary':
+        return portfolio_calculators[kind]
+    return functools.partial(portfolio_calculators[kind], year_match=year_match)
+
+
+def _run_partition(kind, activity, gwp_column, output_unit, year_match):
+    return kind, _calculator(kind, year_match)(activity, _worker_store, gwp_column, output_unit)
+
+
+def partition_activity(activity, partition_by, partitions):
+    """Split ``activity`` into at most ``partitions`` frames, keeping each ``partition_by`` value together.
+
+    Partitions are indexed by row position so results can be put back in order.
+    """
+    if partition_by not in activity.columns:
+        raise ValueError('Activity table has no {!r} column to partition by'.format(partition_by))
+    codes, uniques = pd.factorize(activity[partition_by], use_na_sentinel=False)
+    groups = codes % max(1, min(partitions, len(uniques)))
+    positioned = activity.set_axis(np.arange(len(activity)))
+    return [part for _, part in positioned.groupby(groups, sort=True)]
+
+
+def run_portfolio(activities, gwp_column, output_unit='mtCO2e', workers=None, partition_by='site',
+                  store_dir=STORE_DIR, partitions_per_worker=4, year_match='exact'):
+    """Run every ``{calculator name: activity table}`` in ``activities`` on a process pool.
+
+    Scope 2 data years are matched to factor years under ``year_match``.
+    ``workers`` defaults to the CPU count; with one worker the partitions run
+    in this process. Returns ``{calculator name: result table}`` in the row
+    order (and with the index) of each activity table.
+    """
+    workers = workers or os.cpu_count() or 1
+    store = load_factor_store(store_dir)
+    # Build the factor bundle here, so workers only memory-map it
+    load_bundle(store)
+    tasks = []
+    for kind, activity in activities.items():
+        # Scope 1 activity has no data year, so it is always split by site
+        by = partition_by if partition_by in activity.columns else 'site'
+        tasks.extend((kind, part) for part in partition_activity(activity, by, workers * partitions_per_worker))
+
+    if workers == 1:
+        _init_worker(store_dir)
+        finished = [_run_partition(kind, part, gwp_column, output_unit, year_match) for kind, part in tasks]
+    else:
+        with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(store.store_dir,)) as pool:
+            futures = [pool.submit(_run_partition, kind, part, gwp_column, output_unit, year_match)
+                       for kind, part in tasks]
+            finished = [future.result() for future in futures]
+
+    results = {}
+    for kind in activities:
+        parts = [result for done_kind, result in finished if done_kind == kind]
+        if not parts:
+            results[kind] = _calculator(kind, year_match)(activities[kind], store, gwp_column, output_unit)
+            continue
+        results[kind] = pd.concat(parts).sort_index().set_axis(activities[kind].index)
+    return results
+
+
+def scaling_report(activities, gwp_column, output_unit='mtCO2e', worker_counts=None, partition_by='site',
+                   store_dir=STORE_DIR, year_match='exact'):
+    """Time ``run_portfolio`` for each worker count; returns rows/s and speedup per count."""
+    if worker_counts is None:
+        cpus = os.cpu_count() or 1
+        worker_counts = [2 ** i for i in range(cpus.bit_length()) if 2 ** i <= cpus]
+    rows = sum(len(activity) for activity in activities.values())
+    report = []
+    for workers in worker_counts:
+        start = time.perf_counter()
+        run_portfolio(activities, gwp_column, output_unit, workers, partition_by, store_dir, year_match=year_match)
+        elapsed = time.perf_counter() - start
+        report.append({'workers': workers, 'seconds': elapsed, 'rows/s': rows / elapsed})
+    report = pd.DataFrame(report)
+    report['speedup'] = report['seconds'].iloc[0] / report['seconds']
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Run a portfolio of batch calculations on a process pool.')
+    for kind in portfolio_calculators:
+        parser.add_argument('--' + kind.replace('_', '-'), dest=kind, help='{} activity table'.format(kind))
+    parser.add_argument('--gwp', default='AR6', help='GWP report column (default: %(default)s)')
+    parser.add_argument('--unit', default='mtCO2e', choices=batch_output_units)
+    parser.add_argument('--workers', type=int, help='worker processes (default: CPU count)')
+    parser.add_argument('--partition-by', default='site', choices=['site', 'data_year'])
+    parser.add_argument('--year-match', default='exact', choices=year_match_rules,
+                        help='factor year for Scope 2 data years without factors (default: %(default)s)')
+    parser.add_argument('--output-dir', help='directory for the per-calculator result CSVs')
+    parser.add_argument('--scaling', action='store_true', help='report throughput for 1, 2, 4, ... workers')
+    args = parser.parse_args(argv)
+    activities = {kind: read_activity(getattr(args, kind)) for kind in portfolio_calculators if getattr(args, kind)}
+    if not activities:
+        parser.error('give at least one activity table')
+    if args.scaling:
+        print(scaling_report(activities, args.gwp, args.unit, partition_by=args.partition_by,
+                             year_match=args.year_match).to_string(index=False))
+        return
+    results = run_portfolio(activities, args.gwp, args.unit, args.workers, args.partition_by,
+                            year_match=args.year_match)
+    for kind, result in results.items():
+        if args.output_dir:
+            os.makedirs(args.output_dir, exist_ok=True)
+            result.to_csv(os.path.join(args.output_dir, kind + '.csv'), index=False)
+        print('{}: {:,} rows, {:,} unmatched'.format(
+            kind, len(result), int(result.filter(like='Total CO2e').isna().any(axis=1).sum())))
+
+
+if __name__ == '__main__':
+    main()
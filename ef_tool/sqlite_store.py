@@ -0,0 +1,261 @@
+"""SQLite factor database and query layer.
+
+An alternative to the in-memory indexes: every factor table (eGRID year
+files, GWP, Scope 1 fuels, EEI utilities) is written to one SQLite file
+with indexes on (subregion, category, year), (fuel) and
+(state, company, year). The query classes below answer the same calls as
+the in-memory index objects, so setting ``EF_TOOL_BACKEND=sqlite`` makes
+``ef_tool.index`` (and through it the app and ``ef_tool.calc``) serve
+lookups from the database.
+
+Connections are opened read-only, one per thread, so any number of server
+processes can query the same file concurrently. The database lives inside
+the store version unless ``EF_TOOL_SQLITE_PATH`` names another file (e.g.
+one that ships with the app); a file built for another store version is
+rebuilt on open. Build it ahead of time with::
+
+    EF_TOOL_SQLITE_PATH=factors.sqlite python -m ef_tool.sqlite_store
+"""
+import argparse
+import os
+import sqlite3
+import tempfile
+import threading
+
+import numpy as np
+
+from ef_tool.index import (build_egrid_index, build_gwp_matrix, build_scope_1_index, egrid_factor_columns,
+                           egrid_provenance_columns, main_gases, normalize_fuel,
+                           scope_1_factor_columns, scope_1_fuel_column)
+from ef_tool.store import market_columns
+
+sqlite_file = 'factors.sqlite'
+
+sqlite_path_env = 'EF_TOOL_SQLITE_PATH'
+
+schema = """
+CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE egrid (
+    acronym TEXT NOT NULL, acronym_key TEXT NOT NULL, category TEXT NOT NULL, data_year INTEGER NOT NULL,
+    subregion_name TEXT, co2 REAL, ch4 REAL, n2o REAL,
+    ef_country TEXT, ef_authority TEXT, ef_data_year INTEGER, ef_release_year INTEGER
+);
+CREATE UNIQUE INDEX egrid_key ON egrid (acronym_key, category, data_year);
+CREATE TABLE gwp (gas TEXT NOT NULL, gas_order INTEGER NOT NULL, report TEXT NOT NULL, report_order INTEGER NOT NULL,
+                  value REAL, PRIMARY KEY (gas, report));
+CREATE TABLE scope_1 (
+    row_order INTEGER NOT NULL, fuel TEXT NOT NULL, fuel_key TEXT NOT NULL, combustion_type TEXT,
+    combustion_key TEXT, co2 REAL, ch4 REAL, n2o REAL,
+    ef_country TEXT, ef_authority TEXT, ef_data_year INTEGER, ef_release_year INTEGER
+);
+CREATE INDEX scope_1_fuel ON scope_1 (fuel_key, combustion_key);
+CREATE TABLE eei (
+    row_order INTEGER NOT NULL, company_name TEXT, state TEXT, data_year INTEGER,
+    utility_specific_residual_mix_emission_rate REAL, utility_avg_emission_rate REAL,
+    protocol TEXT, emissions_certified TEXT, emission_totals_intensity TEXT
+);
+CREATE INDEX eei_key ON eei (state, company_name, data_year);
+"""
+
+
+def _sql_value(value):
+    if value is None:
+        return None
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float) and np.isnan(value):
+        return None
+    return value
+
+
+def sqlite_path(store):
+    """Database path: ``EF_TOOL_SQLITE_PATH`` if set, else ``factors.sqlite`` inside the store version."""
+    return os.environ.get(sqlite_path_env) or os.path.join(store.path, sqlite_file)
+
+
+def build_sqlite(store, path=None):
+    """Write every factor table of ``store`` to a SQLite file; returns its path."""
+    path = path or sqlite_path(store)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix='.sqlite.tmp')
+    os.close(fd)
+    try:
+        con = sqlite3.connect(tmp_path)
+        with con:
+            con.executescript(schema)
+            con.execute('INSERT INTO meta VALUES (?, ?)', ('version', store.version))
+            con.executemany('INSERT INTO egrid VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', [
+                (r['eGRID Subregion Acronym'], key[0], key[1], key[2], r['eGRID Subregion Name'],
+                 *(r[col] for col in egrid_factor_columns), *(r[col] for col in egrid_provenance_columns[1:]))
+                for key, r in build_egrid_index(store.egrid_all()).items()])
+            gwp = build_gwp_matrix(store.gwp)
+            con.executemany('INSERT INTO gwp VALUES (?, ?, ?, ?, ?)', [
+                (gas, i, report, j, _sql_value(gwp.values[i, j]))
+                for i, gas in enumerate(gwp.gases) for j, report in enumerate(gwp.reports)])
+            scope_1 = build_scope_1_index(store.scope_1)
+            con.executemany('INSERT INTO scope_1 VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', [
+                (i, r[scope_1_fuel_column], normalize_fuel(r[scope_1_fuel_column]), r['Combustion Type'],
+                 normalize_fuel(r['Combustion Type']), *(r[col] for col in scope_1_factor_columns),
+                 r['EF Country'], r['EF Authority'], r['EF Data Year'], r['EF Release Year'])
+                for i, r in enumerate(scope_1._records)])
+            con.executemany('INSERT INTO eei VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)', [
+                (i, *(_sql_value(v) for v in row))
+                for i, row in enumerate(store.market[market_columns].itertuples(index=False, name=None))])
+        con.close()
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return path
+
+
+class FactorDB:
+    """Read-only connection pool over one factor database file."""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self.egrid = SQLiteEGrid(self)
+        self.gwp = SQLiteGWP(self)
+        self.scope_1 = SQLiteScope1(self)
+        self.market = SQLiteMarket(self)
+
+    def query(self, sql, params=()):
+        con = getattr(self._local, 'con', None)
+        if con is None:
+            con = sqlite3.connect('file:{}?mode=ro'.format(self.path), uri=True)
+            con.row_factory = sqlite3.Row
+            self._local.con = con
+        return con.execute(sql, params).fetchall()
+
+
+class SQLiteEGrid:
+    """eGRID lookups answering ``lookup_egrid`` like the in-memory index dict."""
+
+    def __init__(self, db):
+        self._db = db
+
+    def get(self, key, default=None):
+        acronym_key, category, data_year = key
+        rows = self._db.query('SELECT * FROM egrid WHERE acronym_key = ? AND category = ? AND data_year = ?',
+                              (acronym_key, category, data_year))
+        if not rows:
+            return default
+        r = rows[0]
+        record = dict(zip(egrid_factor_columns, (r['co2'], r['ch4'], r['n2o'])))
+        record.update(zip(egrid_provenance_columns, (r['subregion_name'], r['ef_country'], r['ef_authority'],
+                                                     r['ef_data_year'], r['ef_release_year'])))
+        record.update({'eGRID Subregion Acronym': r['acronym'], 'EF Category': r['category'],
+                       'Data Year': r['data_year']})
+        return record
+
+    def acronyms(self, data_year):
+        """Subregion acronyms listed for ``data_year``, in file order."""
+        rows = self._db.query('SELECT DISTINCT acronym FROM egrid WHERE data_year = ? ORDER BY rowid', (int(data_year),))
+        return [r['acronym'] for r in rows]
+
+
+class SQLiteGWP:
+    """GWP lookups with the ``GWPMatrix`` accessors."""
+
+    def __init__(self, db):
+        self._db = db
+        self.gases = [r['gas'] for r in db.query('SELECT DISTINCT gas FROM gwp ORDER BY gas_order')]
+        self.reports = [r['report'] for r in db.query('SELECT DISTINCT report FROM gwp ORDER BY report_order')]
+
+    def value(self, gas, report):
+        rows = self._db.query('SELECT value FROM gwp WHERE gas = ? AND report = ?', (gas, report))
+        if not rows:
+            raise KeyError((gas, report))
+        return np.nan if rows[0]['value'] is None else rows[0]['value']
+
+    def vector(self, report, gases=main_gases):
+        return np.array([self.value(gas, report) for gas in gases], dtype=float)
+
+
+class SQLiteScope1:
+    """Scope 1 lookups with the ``Scope1Index`` accessors."""
+
+    def __init__(self, db):
+        self._db = db
+        rows = db.query('SELECT fuel FROM scope_1 GROUP BY fuel_key ORDER BY MIN(row_order)')
+        self.fuels = [r['fuel'] for r in rows]
+
+    def record(self, fuel, combustion_type=None):
+        if combustion_type is None:
+            rows = self._db.query('SELECT * FROM scope_1 WHERE fuel_key = ? ORDER BY row_order LIMIT 1',
+                                  (normalize_fuel(fuel),))
+        else:
+            rows = self._db.query('SELECT * FROM scope_1 WHERE fuel_key = ? AND combustion_key = ? '
+                                  'ORDER BY row_order LIMIT 1', (normalize_fuel(fuel), normalize_fuel(combustion_type)))
+        if not rows:
+            return None
+        r = rows[0]
+        record = {scope_1_fuel_column: r['fuel']}
+        record.update(zip(scope_1_factor_columns, (r['co2'], r['ch4'], r['n2o'])))
+        record.update({'EF Country': r['ef_country'], 'EF Authority': r['ef_authority'],
+                       'EF Data Year': r['ef_data_year'], 'EF Release Year': r['ef_release_year'],
+                       'Combustion Type': r['combustion_type']})
+        return record
+
+
+class SQLiteMarket:
+    """EEI lookups with the ``MarketIndex`` accessors."""
+
+    def __init__(self, db):
+        self._db = db
+        rows = db.query("SELECT DISTINCT state FROM eei WHERE state IS NOT NULL AND lower(state) != 'nan' ORDER BY state")
+        self.states = [r['state'] for r in rows]
+
+    def companies(self, state):
+        rows = self._db.query('SELECT company_name FROM eei WHERE state = ? GROUP BY company_name '
+                              'ORDER BY MIN(row_order)', (state,))
+        return [r['company_name'] for r in rows]
+
+    def years(self, state, company):
+        rows = self._db.query('SELECT data_year FROM eei WHERE state = ? AND company_name = ? GROUP BY data_year '
+                              'ORDER BY MIN(row_order)', (state, company))
+        return [r['data_year'] for r in rows]
+
+    def record(self, state, company, year):
+        rows = self._db.query('SELECT * FROM eei WHERE state = ? AND company_name = ? AND data_year = ? '
+                              'ORDER BY row_order LIMIT 1', (state, company, int(year)))
+        if not rows:
+            return None
+        record = {col: rows[0][col] for col in market_columns}
+        for col in ('utility_specific_residual_mix_emission_rate', 'utility_avg_emission_rate'):
+            if record[col] is None:
+                record[col] = np.nan
+        return record
+
+
+def _db_version(path):
+    con = sqlite3.connect('file:{}?mode=ro'.format(path), uri=True)
+    try:
+        row = con.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+    except sqlite3.DatabaseError:
+        return None
+    finally:
+        con.close()
+    return row[0] if row else None
+
+
+def open_factor_db(store, path=None):
+    """Open the database for ``store``, building it first if it is missing or from another store version."""
+    path = path or sqlite_path(store)
+    if not os.path.exists(path) or _db_version(path) != store.version:
+        build_sqlite(store, path)
+    return FactorDB(path)
+
+
+def main(argv=None):
+    from ef_tool.store import load_factor_store
+    parser = argparse.ArgumentParser(description='Build the SQLite factor database.')
+    parser.add_argument('--output', help='database path (default: $EF_TOOL_SQLITE_PATH, else inside the current '
+                                         'store version); the sqlite backend reads $EF_TOOL_SQLITE_PATH')
+    args = parser.parse_args(argv)
+    print('Wrote {}'.format(build_sqlite(load_factor_store(), args.output)))
+
+
+if __name__ == '__main__':
+    main()
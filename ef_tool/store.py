@@ -0,0 +1,392 @@
+"""Compiled columnar factor store.
+
+The Streamlit apps used to call ``pd.read_excel`` on every rerun. This module
+compiles every source the app reads (the eGRID ``year_files`` workbooks,
+GWP.xlsx, Scope_1_stationary_fuel.xlsx with its Scope_1_heat_content.csv
+fuel heating values, the ingested EEI_clean.parquet and the
+eGRID_subregion_map.csv utility/state to eGRID subregion mapping)
+into Parquet files
+once, and gives the app a loader that reads those instead.
+
+The store lives in ``factor_store/<version>/`` where ``version`` is a hash of
+the source file contents; ``factor_store/manifest.json`` points at the current
+version and records the source file stamps used to detect stale builds.
+
+Each dataset also carries its own content hash. A rebuild reuses the compiled
+files of datasets whose source did not change, and caches keyed on dataset
+hashes (see ``FactorStore.dataset_key``) stay valid across it. Artifacts
+derived from a subset of datasets live in ``factor_store/derived/``, keyed by
+the hashes of the datasets they were built from.
+
+Build (or rebuild) the store from the repository root with::
+
+    python -m ef_tool.store
+"""
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+import pandas as pd
+
+from ef_tool.cache import dataset_cache
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STORE_DIR = os.path.join(BASE_DIR, 'factor_store')
+
+# Bump when the compiled layout changes so old stores are rebuilt
+STORE_FORMAT = 2
+
+# Define year-to-file mapping for Scope 2 data
+year_files = {
+    '2025': 'Raw_eGRID_EF_2025.xlsx',
+    '2024': 'Raw_eGRID_EF_2024.xlsx',
+    '2023': 'Raw_eGRID_EF_2023.xlsx',
+    '2022': 'Raw_eGRID_EF_2022.xlsx',
+    '2021': 'Raw_eGRID_EF_2021.xlsx',
+    '2020': 'Raw_eGRID_EF_2020.xlsx'
+}
+
+gwp_file_path = 'GWP.xlsx'
+scope_1_file_path = 'Scope_1_stationary_fuel.xlsx'
+heat_content_file_path = 'Scope_1_heat_content.csv'
+market_file_path = 'EEI_clean.parquet'
+subregion_map_file_path = 'eGRID_subregion_map.csv'
+
+market_columns = [
+    'company_name', 'state', 'data_year', 'utility_specific_residual_mix_emission_rate',
+    'utility_avg_emission_rate', 'protocol', 'emissions_certified', 'emission_totals_intensity'
+]
+
+
+def source_files():
+    """Return the dataset name -> source file mapping compiled into the store."""
+    sources = {'egrid_{}'.format(year): path for year, path in year_files.items()}
+    sources['gwp'] = gwp_file_path
+    sources['scope_1'] = scope_1_file_path
+    sources['heat_content'] = heat_content_file_path
+    sources['market'] = market_file_path
+    sources['subregion_map'] = subregion_map_file_path
+    return sources
+
+
+def _source_path(path):
+    return path if os.path.isabs(path) else os.path.join(BASE_DIR, path)
+
+
+def _file_stamp(path):
+    stat = os.stat(_source_path(path))
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def _hash_key(*parts):
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(str(part).encode())
+        digest.update(b'\0')
+    return digest.hexdigest()[:16]
+
+
+def source_versions(sources=None):
+    """Content hash of each dataset's source file (with the store format)."""
+    sources = sources or source_files()
+    versions = {}
+    for name, path in sources.items():
+        with open(_source_path(path), 'rb') as f:
+            versions[name] = _hash_key(STORE_FORMAT, name, hashlib.sha256(f.read()).hexdigest())
+    return versions
+
+
+def dataset_version(sources=None):
+    """Hash the store format and the content of every source file."""
+    versions = source_versions(sources)
+    return _hash_key(*('{}={}'.format(name, versions[name]) for name in sorted(versions)))
+
+
+# ---------------------------------------------------------------------------
+# Source readers: the only place the raw workbooks are parsed
+
+def read_egrid_source(path, year):
+    df = pd.read_excel(_source_path(path), engine='openpyxl')
+    df['Data Year'] = int(year)
+    return df
+
+
+def read_gwp_source(path=gwp_file_path):
+    df = pd.read_excel(_source_path(path))
+    gwp_cols = [c for c in df.columns if c != 'Global Warming Potential']
+    df[gwp_cols] = df[gwp_cols].astype(float)
+    return df
+
+
+# Scope 1 sheet columns: normalized header prefix -> (column name, dtype)
+scope_1_schema = [
+    ('stationary combustion fuel', 'Stationary combustion fuel', str),
+    ('co2 factor', 'CO2 Factor (kg/ mmBtu)', float),
+    ('ch4 factor', 'CH4 Factor (g/ mmBtu)', float),
+    ('n2o factor', 'N2O Factor (g / mmBtu)', float),
+    ('ef country', 'EF Country', str),
+    ('ef authority', 'EF Authority', str),
+    ('ef data year', 'EF Data Year', int),
+    ('ef release year', 'EF Release Year', int),
+    ('combustion type', 'Combustion Type', str),
+]
+
+
+def _normalize_header(value):
+    return ' '.join(str(value).split()).casefold() if not pd.isna(value) else ''
+
+
+def find_header_row(raw, first_prefix):
+    """Position of the first row of ``raw`` with a cell starting with ``first_prefix``."""
+    for i, row in enumerate(raw.itertuples(index=False, name=None)):
+        if any(_normalize_header(v).startswith(first_prefix) for v in row):
+            return i
+    raise ValueError('No header row starting with "{}" found'.format(first_prefix))
+
+
+def read_scope_1_source(path=scope_1_file_path):
+    """Read the Scope 1 sheet wherever its header row and columns sit.
+
+    The header row is located by its fuel column, columns are matched by
+    header prefix and cast to the types in ``scope_1_schema``.
+    """
+    raw = pd.read_excel(_source_path(path), header=None)
+    header_pos = find_header_row(raw, scope_1_schema[0][0])
+    headers = [_normalize_header(v) for v in raw.iloc[header_pos]]
+    body = raw.iloc[header_pos + 1:]
+    columns = {}
+    for prefix, name, dtype in scope_1_schema:
+        matches = [i for i, h in enumerate(headers) if h.startswith(prefix)]
+        if not matches:
+            raise ValueError('{} has no column starting with "{}"'.format(path, prefix))
+        values = body.iloc[:, matches[0]]
+        if dtype is str:
+            columns[name] = [' '.join(str(v).split()) if not pd.isna(v) else None for v in values]
+        else:
+            columns[name] = pd.to_numeric(values, errors='coerce').astype(float)
+    df = pd.DataFrame(columns)
+    df = df[df['Stationary combustion fuel'].notna()].reset_index(drop=True)
+    for prefix, name, dtype in scope_1_schema:
+        if dtype is int:
+            # Nullable, so a fuel row with a blank year does not abort the build
+            df[name] = df[name].astype('Int64')
+    return df
+
+
+def read_heat_content_source(path=heat_content_file_path):
+    # Higher heating value of each fuel per physical unit, e.g. 0.001026 mmBtu/scf
+    df = pd.read_csv(_source_path(path), dtype=str, keep_default_na=False)
+    missing = [c for c in ('fuel', 'heat_content', 'heat_content_unit') if c not in df.columns]
+    if missing:
+        raise ValueError('{} is missing column(s): {}'.format(path, ', '.join(missing)))
+    df = df.apply(lambda col: col.str.strip())
+    df['heat_content'] = pd.to_numeric(df['heat_content'], errors='raise').astype(float)
+    return df
+
+
+def read_market_source(path=market_file_path):
+    # Produced by ``python -m ef_tool.ingest``, already cleaned and typed
+    df_market = pd.read_parquet(_source_path(path))
+    missing = [c for c in market_columns if c not in df_market.columns]
+    if missing:
+        raise ValueError('{} is missing column(s): {}'.format(path, ', '.join(missing)))
+    return df_market[market_columns]
+
+
+def read_subregion_map_source(path=subregion_map_file_path):
+    # Rows with a company_name map one EEI utility record; rows without one are state defaults
+    df = pd.read_csv(_source_path(path), dtype=str, keep_default_na=False)
+    missing = [c for c in ('state', 'company_name', 'egrid_subregion') if c not in df.columns]
+    if missing:
+        raise ValueError('{} is missing column(s): {}'.format(path, ', '.join(missing)))
+    return df.apply(lambda col: col.str.strip())
+
+
+# ---------------------------------------------------------------------------
+# Build
+
+def _read_manifest(store_dir):
+    try:
+        with open(os.path.join(store_dir, 'manifest.json')) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_json_atomic(path, payload):
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    with os.fdopen(fd, 'w') as f:
+        json.dump(payload, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def _source_readers():
+    readers = {'egrid_{}'.format(year): (lambda path=path, year=year: read_egrid_source(path, year))
+               for year, path in year_files.items()}
+    readers['gwp'] = read_gwp_source
+    readers['scope_1'] = read_scope_1_source
+    readers['heat_content'] = read_heat_content_source
+    readers['market'] = read_market_source
+    readers['subregion_map'] = read_subregion_map_source
+    return readers
+
+
+def _reuse_file(src, dst):
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+
+
+def build_factor_store(store_dir=STORE_DIR):
+    """Compile the sources into the Parquet store; returns the manifest.
+
+    Only datasets whose source changed since the previous build are parsed
+    again; the others are linked from the previous version.
+    """
+    sources = source_files()
+    stamps = {name: _file_stamp(path) for name, path in sources.items()}
+    datasets = source_versions(sources)
+    version = _hash_key(*('{}={}'.format(name, datasets[name]) for name in sorted(datasets)))
+    os.makedirs(store_dir, exist_ok=True)
+
+    previous = _read_manifest(store_dir)
+    previous_datasets = previous.get('datasets', {}) if previous and previous.get('format') == STORE_FORMAT else {}
+    previous_dir = os.path.join(store_dir, previous['version']) if previous_datasets else None
+    rebuilt = []
+
+    # Write into a scratch directory and move it into place so readers in
+    # other processes never see a half-written version
+    tmp_dir = tempfile.mkdtemp(dir=store_dir, prefix='.build-')
+    try:
+        for name, read in _source_readers().items():
+            out_path = os.path.join(tmp_dir, name + '.parquet')
+            previous_path = os.path.join(previous_dir, name + '.parquet') if previous_dir else None
+            if previous_datasets.get(name) == datasets[name] and os.path.exists(previous_path):
+                _reuse_file(previous_path, out_path)
+            else:
+                read().to_parquet(out_path, index=False)
+                rebuilt.append(name)
+        version_dir = os.path.join(store_dir, version)
+        if os.path.isdir(version_dir):
+            shutil.rmtree(tmp_dir)
+        else:
+            os.replace(tmp_dir, version_dir)
+    except BaseException:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+
+    manifest = {
+        'format': STORE_FORMAT,
+        'version': version,
+        'years': list(year_files),
+        'sources': stamps,
+        'datasets': datasets,
+        'rebuilt': rebuilt,
+    }
+    _write_json_atomic(os.path.join(store_dir, 'manifest.json'), manifest)
+
+    # Drop superseded versions
+    for entry in os.listdir(store_dir):
+        entry_path = os.path.join(store_dir, entry)
+        if entry not in (version, 'derived') and not entry.startswith('.') and os.path.isdir(entry_path):
+            shutil.rmtree(entry_path, ignore_errors=True)
+    return manifest
+
+
+def is_stale(manifest):
+    """True when the manifest does not match the current source files."""
+    if manifest is None or manifest.get('format') != STORE_FORMAT or 'datasets' not in manifest:
+        return True
+    sources = source_files()
+    if set(manifest.get('sources', {})) != set(sources):
+        return True
+    return any(manifest['sources'][name] != _file_stamp(path) for name, path in sources.items())
+
+
+# ---------------------------------------------------------------------------
+# Load
+
+class FactorStore:
+    """Read-only view over one compiled store version.
+
+    Datasets come from the process-wide ``dataset_cache``, so every session
+    shares one copy of each frame; callers must not modify them in place.
+    """
+
+    def __init__(self, store_dir, manifest):
+        self.version = manifest['version']
+        self.years = manifest['years']
+        self.datasets = manifest['datasets']
+        self.store_dir = store_dir
+        self.path = os.path.join(store_dir, self.version)
+
+    @property
+    def egrid_datasets(self):
+        return ['egrid_{}'.format(year) for year in self.years]
+
+    def dataset_key(self, names):
+        """Cache key that changes only when one of the named datasets changes."""
+        return _hash_key(*('{}={}'.format(name, self.datasets[name]) for name in sorted(names)))
+
+    def derived_path(self, name, depends, ext='.parquet'):
+        """Path of an artifact built from the ``depends`` datasets only."""
+        return os.path.join(self.store_dir, 'derived', '{}-{}{}'.format(name, self.dataset_key(depends), ext))
+
+    def _read(self, name):
+        return dataset_cache.get(name, os.path.join(self.path, name + '.parquet'), pd.read_parquet,
+                                 version=self.datasets[name])
+
+    @property
+    def gwp(self):
+        return self._read('gwp')
+
+    @property
+    def scope_1(self):
+        return self._read('scope_1')
+
+    @property
+    def heat_content(self):
+        return self._read('heat_content')
+
+    @property
+    def market(self):
+        return self._read('market')
+
+    @property
+    def subregion_map(self):
+        return self._read('subregion_map')
+
+    def egrid_path(self, year):
+        if str(year) not in self.years:
+            raise KeyError('No eGRID data for year {}'.format(year))
+        return os.path.join(self.path, 'egrid_{}.parquet'.format(year))
+
+    def egrid(self, year):
+        """eGRID factors for one ``year_files`` data year, read from disk.
+
+        Lookups go through ``index.egrid_year_index``, which keeps the
+        records of recently used years in the bounded ``egrid_year_cache``.
+        """
+        return pd.read_parquet(self.egrid_path(year))
+
+    def egrid_all(self):
+        """eGRID factors for every data year, tagged with a 'Data Year' column, for one-off builds."""
+        return pd.concat([self.egrid(year) for year in self.years], ignore_index=True)
+
+
+def load_factor_store(store_dir=STORE_DIR, rebuild_if_stale=True):
+    """Load the compiled store, building it first if it is missing or stale."""
+    manifest = _read_manifest(store_dir)
+    if rebuild_if_stale and is_stale(manifest):
+        manifest = build_factor_store(store_dir)
+    elif manifest is None:
+        raise FileNotFoundError('No factor store at {}; run python -m ef_tool.store'.format(store_dir))
+    return FactorStore(store_dir, manifest)
+
+
+if __name__ == '__main__':
+    manifest = build_factor_store()
+    print('Built factor store version {} in {}'.format(manifest['version'], STORE_DIR))
@@ -0,0 +1,204 @@
+"""Out-of-core batch runs over activity files larger than memory.
+
+The activity file is read in fixed-size chunks; each chunk goes through the
+same vectorized calculator as an in-memory batch, its result rows are
+appended to the output file, and the chunk is folded into running totals by
+site, subregion and year (utility instead of subregion for market-based
+Scope 2, fuel for Scope 1). Only one chunk and the totals are ever resident,
+so peak memory depends on the chunk size and the number of distinct sites,
+not on the size of the input::
+
+    python -m ef_tool.stream scope_2_location meters.csv --gwp AR6 --output results.parquet --totals totals/
+"""
+import argparse
+import functools
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from ef_tool.asof import year_match_rules, year_values
+from ef_tool.batch import (batch_output_units, calculate_scope_1_stationary, calculate_scope_2_dual,
+                           calculate_scope_2_location, calculate_scope_2_market, scope_1_activity_columns,
+                           scope_2_activity_columns, scope_2_dual_activity_columns,
+                           scope_2_market_activity_columns)
+
+default_chunk_rows = 250000
+
+# calculator, activity columns, activity quantity column, {totals name: group columns}
+stream_calculators = {
+    'scope_2_location': (calculate_scope_2_location, scope_2_activity_columns, 'kwh',
+                         {'site': ['site'], 'subregion': ['egrid_subregion'], 'year': ['data_year']}),
+    'scope_2_market': (calculate_scope_2_market, scope_2_market_activity_columns, 'kwh',
+                       {'site': ['site'], 'utility': ['state', 'utility'], 'year': ['data_year']}),
+    'scope_2_dual': (calculate_scope_2_dual, scope_2_dual_activity_columns, 'kwh',
+                     {'site': ['site'], 'subregion': ['egrid_subregion'], 'year': ['data_year']}),
+    'scope_1_stationary': (calculate_scope_1_stationary, scope_1_activity_columns, 'quantity',
+                           {'site': ['site'], 'fuel': ['fuel_type']}),
+}
+
+
+def _is_parquet(path):
+    return os.path.splitext(str(path))[1].lower() in ('.parquet', '.pq')
+
+
+def iter_activity_chunks(path, columns, chunk_rows=default_chunk_rows):
+    """Yield DataFrames of at most ``chunk_rows`` rows of ``columns`` from a CSV or Parquet file.
+
+    CSV columns are read as text, so no column's type depends on the values
+    in one chunk.
+    """
+    if _is_parquet(path):
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_rows, columns=columns):
+            yield batch.to_pandas()
+        return
+    yield from pd.read_csv(path, usecols=columns, chunksize=chunk_rows, dtype=str)
+
+
+def normalize_chunk(chunk, quantity_column):
+    """Give a chunk the column types every chunk shares.
+
+    The quantity is float, ``data_year`` a nullable integer and every other
+    column text (missing values stay missing), so a site or utility is the
+    same group key, and the same output type, in every chunk.
+    """
+    chunk = chunk.copy()
+    for col in chunk.columns:
+        values = chunk[col]
+        if col == quantity_column:
+            chunk[col] = pd.to_numeric(values, errors='coerce').astype(float)
+        elif col == 'data_year':
+            years = year_values(values.to_numpy())
+            chunk[col] = pd.arrays.IntegerArray(years, years < 0)
+        else:
+            chunk[col] = values.astype(object).where(values.isna(), values.astype(str))
+    return chunk
+
+
+def _arrow_type(dtype):
+    if pd.api.types.is_float_dtype(dtype):
+        return pa.float64()
+    if pd.api.types.is_integer_dtype(dtype):
+        return pa.int64()
+    return pa.string()
+
+
+class ResultWriter:
+    """Appends result chunks to a CSV or Parquet file as they are produced.
+
+    The Parquet schema is float, integer or string per column from the
+    first chunk's dtypes, all nullable, so a text column that is empty in
+    one chunk (e.g. no subregion for any row) still fits the others.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.rows = 0
+        self._parquet = None
+
+    def write(self, result):
+        if _is_parquet(self.path):
+            if self._parquet is None:
+                schema = pa.schema([(col, _arrow_type(dtype)) for col, dtype in result.dtypes.items()])
+                self._parquet = pq.ParquetWriter(self.path, schema)
+            self._parquet.write_table(pa.Table.from_pandas(result, schema=self._parquet.schema, preserve_index=False))
+        else:
+            result.to_csv(self.path, mode='w' if self.rows == 0 else 'a', header=self.rows == 0, index=False)
+        self.rows += len(result)
+
+    def close(self):
+        if self._parquet is not None:
+            self._parquet.close()
+            self._parquet = None
+
+
+class RunningTotals:
+    """Emission and activity sums per group, folded in one chunk at a time.
+
+    ``columns`` is the activity quantity followed by the emission columns; a
+    row is unmatched when any of its emission columns is NaN.
+    """
+
+    def __init__(self, keys, columns):
+        self.keys = keys
+        self.columns = columns
+        self.totals = None
+
+    def add(self, result):
+        # Keys have the same types in every chunk (see normalize_chunk)
+        keyed = result[self.keys + self.columns]
+        chunk = keyed.groupby(self.keys, dropna=False)[self.columns].sum(min_count=1)
+        chunk['rows'] = keyed.groupby(self.keys, dropna=False).size()
+        chunk['unmatched rows'] = result[self.columns[1:]].isna().any(axis=1).groupby(
+            [keyed[k] for k in self.keys], dropna=False).sum()
+        self.totals = chunk if self.totals is None else self.totals.add(chunk, fill_value=0)
+
+    def result(self):
+        if self.totals is None:
+            return pd.DataFrame(columns=self.keys + self.columns + ['rows', 'unmatched rows'])
+        totals = self.totals.reset_index()
+        totals[['rows', 'unmatched rows']] = totals[['rows', 'unmatched rows']].astype(np.int64)
+        return totals
+
+
+def stream_batch(kind, input_path, store, gwp_column, output_unit='mtCO2e', output_path=None,
+                 chunk_rows=default_chunk_rows, year_match='exact'):
+    """Run the ``kind`` calculator over ``input_path`` chunk by chunk.
+
+    Scope 2 data years are matched to factor years under the ``year_match``
+    rule. Result rows are appended to ``output_path`` when given. Returns
+    ``{totals name: DataFrame}`` with summed emissions, activity, row count
+    and unmatched row count per group.
+    """
+    calculate, columns, quantity_column, groups = stream_calculators[kind]
+    if 'data_year' in columns:
+        calculate = functools.partial(calculate, year_match=year_match)
+    writer = ResultWriter(output_path) if output_path else None
+    totals = None
+    try:
+        for chunk in iter_activity_chunks(input_path, columns, chunk_rows):
+            result = calculate(normalize_chunk(chunk, quantity_column), store, gwp_column, output_unit)
+            if totals is None:
+                # Emission columns only: factor years and rate sources are not summed
+                sums = [quantity_column] + [c for c in result.columns
+                                            if c not in columns and result[c].dtype == np.float64]
+                totals = {name: RunningTotals(keys, sums) for name, keys in groups.items()}
+            for running in totals.values():
+                running.add(result)
+            if writer is not None:
+                writer.write(result)
+    finally:
+        if writer is not None:
+            writer.close()
+    if totals is None:
+        return {name: pd.DataFrame(columns=keys) for name, keys in groups.items()}
+    return {name: running.result() for name, running in totals.items()}
+
+
+def main(argv=None):
+    from ef_tool.store import load_factor_store
+    parser = argparse.ArgumentParser(description='Run a batch calculation over a large activity file in chunks.')
+    parser.add_argument('kind', choices=sorted(stream_calculators))
+    parser.add_argument('input', help='activity table (.csv or .parquet)')
+    parser.add_argument('--gwp', default='AR6', help='GWP report column (default: %(default)s)')
+    parser.add_argument('--unit', default='mtCO2e', choices=batch_output_units)
+    parser.add_argument('--output', help='per-row results (.csv or .parquet)')
+    parser.add_argument('--totals', help='directory for the per-group totals CSVs')
+    parser.add_argument('--chunk-rows', type=int, default=default_chunk_rows)
+    parser.add_argument('--year-match', default='exact', choices=year_match_rules,
+                        help='factor year for Scope 2 data years without factors (default: %(default)s)')
+    args = parser.parse_args(argv)
+    totals = stream_batch(args.kind, args.input, load_factor_store(), args.gwp, args.unit, args.output,
+                          args.chunk_rows, args.year_match)
+    if args.totals:
+        os.makedirs(args.totals, exist_ok=True)
+        for name, df in totals.items():
+            df.to_csv(os.path.join(args.totals, '{}_{}.csv'.format(args.kind, name)), index=False)
+    first = next(iter(totals.values()))
+    print('{:,} rows, {:,} unmatched'.format(int(first['rows'].sum()), int(first['unmatched rows'].sum())))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,133 @@
+"""Unit registry compiled from a conversion graph.
+
+``unit_conversions.csv`` lists every unit with its dimension (mass,
+energy, volume), its aliases and one edge to another unit of the same
+dimension ("1 kWh equals 3.6 MJ"). The edges form a graph per dimension;
+any source -> target pair is compiled once into a single scalar by walking
+that graph, and cached, so converting a whole array is one multiply.
+Adding a unit is a new CSV row, not a code change.
+
+Rate units such as ``kgCO2e/MWh`` or ``g/mmBtu`` are compiled from their
+numerator and denominator; a trailing gas label (``CO2``, ``CO2e``) on a
+mass unit is ignored, so ``lbs CO2/MWh`` converts to ``mtCO2e/kWh``.
+"""
+import csv
+import functools
+import os
+import re
+
+import numpy as np
+import pandas as pd
+
+from ef_tool.store import BASE_DIR
+
+units_file_path = os.path.join(BASE_DIR, 'unit_conversions.csv')
+
+_gas_label = re.compile(r'\s*CO2e?$')
+
+
+def normalize_unit(unit):
+    return ' '.join(str(unit).split()).casefold()
+
+
+class UnitRegistry:
+    """Units and their conversion edges, with compiled pair factors cached."""
+
+    def __init__(self, rows):
+        self.dimensions = {}
+        self._names = {}
+        self._edges = {}
+        for row in rows:
+            unit = row['unit'].strip()
+            self.dimensions[unit] = row['dimension'].strip()
+            for name in [unit] + [a for a in row.get('aliases', '').split('|') if a.strip()]:
+                key = normalize_unit(name)
+                if self._names.setdefault(key, unit) != unit:
+                    raise ValueError('Unit name "{}" is used by both {} and {}'.format(name, self._names[key], unit))
+            self._edges.setdefault(unit, {})
+        for row in rows:
+            if not row.get('equals', '').strip():
+                continue
+            unit, other, factor = row['unit'].strip(), self.unit(row['of_unit']), float(row['equals'])
+            if self.dimensions[unit] != self.dimensions[other]:
+                raise ValueError('Cannot relate {} ({}) to {} ({})'.format(
+                    unit, self.dimensions[unit], other, self.dimensions[other]))
+            self._edges[unit][other] = factor
+            self._edges[other][unit] = 1.0 / factor
+        self.factor = functools.lru_cache(maxsize=None)(self._compile)
+
+    def unit(self, name):
+        """Canonical unit for a name or alias; mass units may carry a CO2/CO2e label."""
+        key = normalize_unit(name)
+        if key not in self._names:
+            key = normalize_unit(_gas_label.sub('', str(name).strip()))
+        if key not in self._names:
+            raise ValueError('Unknown unit: {}'.format(name))
+        return self._names[key]
+
+    def dimension(self, name):
+        """'mass', 'energy' or 'volume' for a unit name or alias."""
+        return self.dimensions[self.unit(name)]
+
+    def units(self, dimension):
+        return [unit for unit, dim in self.dimensions.items() if dim == dimension]
+
+    def _path_factor(self, source, target):
+        source, target = self.unit(source), self.unit(target)
+        if self.dimensions[source] != self.dimensions[target]:
+            raise ValueError('Cannot convert {} ({}) to {} ({})'.format(
+                source, self.dimensions[source], target, self.dimensions[target]))
+        # Breadth-first walk multiplying edge factors; units per dimension are few
+        factors = {source: 1.0}
+        frontier = [source]
+        while frontier and target not in factors:
+            next_frontier = []
+            for unit in frontier:
+                for other, factor in self._edges[unit].items():
+                    if other not in factors:
+                        factors[other] = factors[unit] * factor
+                        next_frontier.append(other)
+            frontier = next_frontier
+        if target not in factors:
+            raise ValueError('No conversion path from {} to {}'.format(source, target))
+        return factors[target]
+
+    def _compile(self, source, target):
+        source_parts, target_parts = str(source).split('/'), str(target).split('/')
+        if len(source_parts) != len(target_parts) or len(source_parts) > 2:
+            raise ValueError('Cannot convert {} to {}'.format(source, target))
+        factor = self._path_factor(source_parts[0], target_parts[0])
+        if len(source_parts) == 2:
+            factor /= self._path_factor(source_parts[1], target_parts[1])
+        return factor
+
+    def convert(self, values, source, target):
+        """``values`` (scalar or array) in ``source`` units expressed in ``target`` units."""
+        return np.asarray(values, dtype=float) * self.factor(source, target)
+
+    def factors_to(self, units, target):
+        """Per-element factors from an array of unit names to ``target``; NaN for unknown or incompatible units."""
+        codes, uniques = pd.factorize(pd.Series(units), use_na_sentinel=True)
+        mapped = np.full(len(uniques) + 1, np.nan)
+        for i, unit in enumerate(uniques):
+            try:
+                mapped[i] = self.factor(str(unit), target)
+            except ValueError:
+                pass
+        return mapped[codes]
+
+
+def load_registry(path=units_file_path):
+    with open(path, newline='') as f:
+        return UnitRegistry(list(csv.DictReader(f)))
+
+
+@functools.lru_cache(maxsize=None)
+def default_registry():
+    """The registry for ``unit_conversions.csv``, loaded once per process."""
+    return load_registry()
+
+
+def conversion_factor(source, target):
+    """Cached scalar converting ``source`` units to ``target`` units, e.g. ('lb/MWh', 'mtCO2e/kWh')."""
+    return default_registry().factor(source, target)